@@ -135,6 +135,8 @@ CREATE TABLE bills (
     customer_id INT NULL,
     paid_amount DECIMAL(10,2) NOT NULL DEFAULT 0.00,
     due_amount DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+    idempotency_key NVARCHAR(64) NULL,
+    version INT NOT NULL DEFAULT 1,
     CONSTRAINT FK_bills_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE,
     CONSTRAINT FK_bills_customer FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
 );
@@ -150,6 +152,14 @@ CREATE TABLE bill_items (
     quantity INT NOT NULL,
     price_per_unit DECIMAL(10,2) NOT NULL,
     total_price DECIMAL(12,2) NOT NULL,
+    product_name NVARCHAR(100) NULL,
+    hsn_code NVARCHAR(20) NULL,
+    gst_rate DECIMAL(5,2) NULL,
+    discount_percent DECIMAL(5,2) NULL,
+    discount_amount DECIMAL(10,2) NULL,
+    taxable_value DECIMAL(12,2) NULL,
+    cgst_amount DECIMAL(10,2) NULL,
+    sgst_amount DECIMAL(10,2) NULL,
     CONSTRAINT FK_bill_items_bill FOREIGN KEY (bill_id) REFERENCES bills(bill_id) ON DELETE CASCADE,
     CONSTRAINT FK_bill_items_product FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE NO ACTION
 );
@@ -233,6 +243,42 @@ CREATE TABLE documents (
     CONSTRAINT FK_documents_ca FOREIGN KEY (ca_id) REFERENCES chartered_accountants(ca_id) ON DELETE NO ACTION
 );
 
+-- Table structure for table invoice_sequences
+-- Invoice number counter per shopkeeper; workers reserve blocks of numbers from it
+CREATE TABLE invoice_sequences (
+    shopkeeper_id INT PRIMARY KEY,
+    next_value INT NOT NULL DEFAULT 1,
+    reset_epoch INT NOT NULL DEFAULT 0,
+    CONSTRAINT FK_invoice_sequences_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE
+);
+
+-- Table structure for table daily_sales_rollup
+-- Per-shopkeeper daily bill totals maintained on bill writes; rebuild with: flask rebuild-sales-rollup
+CREATE TABLE daily_sales_rollup (
+    shopkeeper_id INT NOT NULL,
+    sales_date DATE NOT NULL,
+    bill_count INT NOT NULL DEFAULT 0,
+    gross_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    paid_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    due_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    gst_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at DATETIME2 DEFAULT GETDATE(),
+    CONSTRAINT PK_daily_sales_rollup PRIMARY KEY (shopkeeper_id, sales_date),
+    CONSTRAINT FK_daily_sales_rollup_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE
+);
+
+-- Table structure for table gst_return_snapshots
+-- GST return summary (JSON) of a shopkeeper-month, stored when the month is marked Filed
+CREATE TABLE gst_return_snapshots (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    shopkeeper_id INT NOT NULL,
+    month NVARCHAR(7) NOT NULL,
+    summary NVARCHAR(MAX) NOT NULL,
+    created_at DATETIME2 DEFAULT GETDATE(),
+    CONSTRAINT UQ_gst_return_snapshots_shopkeeper_month UNIQUE (shopkeeper_id, month),
+    CONSTRAINT FK_gst_return_snapshots_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE
+);
+
 -- Create indexes for performance optimization
 CREATE INDEX IX_shopkeepers_user_id ON shopkeepers(user_id);
 CREATE INDEX IX_chartered_accountants_user_id ON chartered_accountants(user_id);
@@ -242,6 +288,8 @@ CREATE INDEX IX_customers_shopkeeper_phone ON customers(shopkeeper_id, phone);
 CREATE INDEX IX_products_shopkeeper_id ON products(shopkeeper_id);
 CREATE INDEX IX_bills_shopkeeper_id ON bills(shopkeeper_id);
 CREATE INDEX IX_bills_customer_id ON bills(customer_id);
+CREATE INDEX IX_bills_shopkeeper_date ON bills(shopkeeper_id, bill_date);
+CREATE UNIQUE INDEX UX_bills_shopkeeper_idempotency ON bills(shopkeeper_id, idempotency_key) WHERE idempotency_key IS NOT NULL;
 CREATE INDEX IX_bill_items_bill_id ON bill_items(bill_id);
 CREATE INDEX IX_bill_items_product_id ON bill_items(product_id);
 CREATE INDEX IX_customer_ledger_customer_id ON customer_ledger(customer_id);
@@ -252,6 +300,7 @@ CREATE INDEX IX_employee_clients_employee_id ON employee_clients(employee_id);
 CREATE INDEX IX_employee_clients_shopkeeper_id ON employee_clients(shopkeeper_id);
 CREATE INDEX IX_gst_filing_shopkeeper_id ON gst_filing_status(shopkeeper_id);
 CREATE INDEX IX_gst_filing_employee_id ON gst_filing_status(employee_id);
+CREATE INDEX IX_gst_filing_shopkeeper_month ON gst_filing_status(shopkeeper_id, month) INCLUDE (status);
 CREATE INDEX IX_documents_shopkeeper_id ON documents(shopkeeper_id);
 CREATE INDEX IX_documents_ca_id ON documents(ca_id);
 
@@ -1,10 +1,18 @@
+import os
+
 from flask import Flask, redirect, url_for
+from jinja2 import FileSystemBytecodeCache
 from .config import Config
 from .extensions import db, login_manager, bcrypt, session
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+
+    # Reuse compiled templates across worker restarts
+    if app.config.get('JINJA_BYTECODE_CACHE_DIR'):
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
 
     # Initialize extensions
     db.init_app(app)
@@ -27,6 +35,9 @@ def create_app():
     app.register_blueprint(api_bp)
     app.register_blueprint(walkthrough_bp)
 
+    from .commands import register_commands
+    register_commands(app)
+
     # Blank route renders the homepage
     @app.route('/')
     def index():
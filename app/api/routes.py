@@ -1,7 +1,128 @@
-from flask import Blueprint, jsonify
+import os
+import datetime
+
+from flask import Blueprint, jsonify, request, send_file
+from flask_login import login_required, current_user
+
+from app.shopkeeper.services import DashboardCache, DashboardService, SalesRollupService
+from app.shopkeeper.services.render_pool import PDFRenderPool
+from app.shopkeeper.services.sales_report_engine import MAX_SERIES_DAYS
+from app.shopkeeper.utils import get_current_shopkeeper
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 @api_bp.route('/ping')
 def ping():
     return jsonify({'message': 'pong'})
+
+
+def _owned_render_job(job_id):
+    """Job status if it exists and was started by the current user."""
+    status = PDFRenderPool.read_status(job_id)
+    if status is None or status.get('user_id') != current_user.user_id:
+        return None
+    return status
+
+
+@api_bp.route('/render_jobs/<job_id>')
+@login_required
+def render_job_status(job_id):
+    status = _owned_render_job(job_id)
+    if status is None:
+        return jsonify({'success': False, 'message': 'Render job not found'}), 404
+    return jsonify(PDFRenderPool.public_status(status))
+
+
+@api_bp.route('/render_jobs/<job_id>/download')
+@login_required
+def render_job_download(job_id):
+    status = _owned_render_job(job_id)
+    if status is None:
+        return jsonify({'success': False, 'message': 'Render job not found'}), 404
+    if status.get('state') != 'done':
+        return jsonify(PDFRenderPool.public_status(status)), 409
+    if not os.path.exists(status['pdf_path']):
+        # Evicted from the PDF cache since the job finished
+        return jsonify({'success': False, 'message': 'PDF expired, please download the bill again'}), 410
+    return send_file(status['pdf_path'], download_name=f"bill_{status['bill_number']}.pdf",
+                     mimetype='application/pdf')
+
+
+def _conditional_json(payload, last_modified=None):
+    """
+    JSON response with an ETag (and Last-Modified when known) that answers a
+    matching If-None-Match / If-Modified-Since with 304. The browser keeps the
+    body but revalidates on every load, so changes show up immediately.
+    """
+    response = jsonify(payload)
+    response.add_etag()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _dashboard_kpis(shopkeeper_id):
+    return DashboardCache.get_or_build(shopkeeper_id, 'kpis', lambda: DashboardService.kpis(shopkeeper_id))
+
+
+def _chart_window_updated(shopkeeper_id):
+    """Last rollup refresh within the dashboard's six-month window."""
+    months = DashboardService.chart_months(datetime.date.today())
+    return SalesRollupService.last_updated(shopkeeper_id, months[0][0], months[-1][1])
+
+
+@api_bp.route('/dashboard/kpis')
+@login_required
+def dashboard_kpis():
+    """Figures for the shopkeeper dashboard's KPI cards."""
+    shopkeeper = get_current_shopkeeper()
+    if shopkeeper is None:
+        return jsonify({'success': False, 'message': 'Shopkeeper not found'}), 404
+    kpis = _dashboard_kpis(shopkeeper.shopkeeper_id)
+    payload = {key: kpis[key] for key in ('total_amount', 'paid', 'unpaid', 'partial', 'monthly_total',
+                                          'monthly_bills_count', 'monthly_growth')}
+    return _conditional_json(payload, _chart_window_updated(shopkeeper.shopkeeper_id))
+
+
+@api_bp.route('/dashboard/monthly_sales')
+@login_required
+def dashboard_monthly_sales():
+    """Six-month sales series for the shopkeeper dashboard chart."""
+    shopkeeper = get_current_shopkeeper()
+    if shopkeeper is None:
+        return jsonify({'success': False, 'message': 'Shopkeeper not found'}), 404
+    kpis = _dashboard_kpis(shopkeeper.shopkeeper_id)
+    payload = {'labels': kpis['monthly_sales_labels'], 'data': kpis['monthly_sales_data']}
+    return _conditional_json(payload, _chart_window_updated(shopkeeper.shopkeeper_id))
+
+
+@api_bp.route('/reports/daily_sales')
+@login_required
+def report_daily_sales():
+    """Per-day sales and bill counts between start and end (YYYY-MM-DD, default the last 7 days)."""
+    shopkeeper = get_current_shopkeeper()
+    if shopkeeper is None:
+        return jsonify({'success': False, 'message': 'Shopkeeper not found'}), 404
+    today = datetime.date.today()
+    try:
+        start_date = datetime.datetime.strptime(request.args['start'], '%Y-%m-%d').date() \
+            if request.args.get('start') else today - datetime.timedelta(days=6)
+        end_date = datetime.datetime.strptime(request.args['end'], '%Y-%m-%d').date() \
+            if request.args.get('end') else today
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    num_days = (end_date - start_date).days + 1
+    if num_days < 1 or num_days > MAX_SERIES_DAYS:
+        return jsonify({'success': False, 'message': f'Range must be 1 to {MAX_SERIES_DAYS} days'}), 400
+
+    daily = SalesRollupService.daily_rows(shopkeeper.shopkeeper_id, start_date, end_date)
+    dates = [start_date + datetime.timedelta(days=i) for i in range(num_days)]
+    payload = {
+        'labels': [d.strftime('%Y-%m-%d') for d in dates],
+        'sales': [float(daily[d].gross_total) if d in daily else 0 for d in dates],
+        'bill_counts': [daily[d].bill_count if d in daily else 0 for d in dates],
+    }
+    last_modified = max((row.updated_at for row in daily.values() if row.updated_at), default=None)
+    return _conditional_json(payload, last_modified)
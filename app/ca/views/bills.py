@@ -2,7 +2,7 @@
 Bills management routes for CA.
 Extracted from original routes.py - maintaining all original logic.
 """
-from flask import render_template, redirect, url_for, request, flash, send_file
+from flask import render_template, redirect, url_for, request, flash, send_file, abort
 from flask_login import login_required, current_user
 from sqlalchemy import and_
 import io
@@ -10,6 +10,8 @@ import io
 from app.models import (CharteredAccountant, CAEmployee, EmployeeClient, Bill, BillItem, 
                        Shopkeeper, CAConnection, Product)
 from app.extensions import db
+from app.shopkeeper.services import BillService, InventoryService, ReceiptService, PDFCache
+from app.shopkeeper.services.render_pool import render_pool
 
 
 def register_routes(bp):
@@ -113,7 +115,7 @@ def register_routes(bp):
             flash('Access denied: Invalid role.', 'danger')
             return redirect(url_for('auth.login'))
 
-        bill = Bill.query.get_or_404(bill_id)
+        bill = ReceiptService.load_bill(bill_id) or abort(404)
         print(f"Found bill {bill.bill_id} for shopkeeper {bill.shopkeeper_id}")
 
         # Initialize access check
@@ -157,98 +159,21 @@ def register_routes(bp):
         # Download PDF flag
         is_download = request.args.get('download') == 'true'
 
-        # Get bill items and related data
-        bill_items = BillItem.query.filter_by(bill_id=bill.bill_id).all()
-        shopkeeper = bill.shopkeeper
-        products = Product.query.filter_by(shopkeeper_id=shopkeeper.shopkeeper_id).all()
-        products_dict = {str(p.product_id): p for p in products}
-
-        # GST Summary calculations
-        bill_items_data = []
-        gst_summary_by_rate = {}
-        total_taxable_amount = 0
-        total_cgst_amount = 0
-        total_sgst_amount = 0
-        total_gst_amount = 0
-        overall_grand_total = 0
-
-        for item in bill_items:
-            product = products_dict.get(str(item.product_id))
-            if not product:
-                continue
-            base_price = float(item.price_per_unit)
-            quantity = int(item.quantity)
-            total_price = base_price * quantity
-
-            discount = 0
-            discount_amount = (discount / 100) * total_price
-            discounted_price = total_price - discount_amount
-
-            gst_rate = float(product.gst_rate or 0)
-            sgst_rate = cgst_rate = gst_rate / 2
-            sgst_amount = (sgst_rate / 100) * discounted_price
-            cgst_amount = (cgst_rate / 100) * discounted_price
-            final_price = discounted_price + sgst_amount + cgst_amount
-
-            item_data = {
-                'product': product,
-                'hsn_code': product.hsn_code if hasattr(product, 'hsn_code') else '',
-                'quantity': quantity,
-                'base_price': base_price,
-                'discount': discount,
-                'discount_amount': discount_amount,
-                'discounted_price': discounted_price,
-                'sgst_rate': sgst_rate,
-                'sgst_amount': sgst_amount,
-                'cgst_rate': cgst_rate,
-                'cgst_amount': cgst_amount,
-                'final_price': final_price
-            }
-            bill_items_data.append(item_data)
-
-            gst_summary_by_rate.setdefault(gst_rate, {
-                'taxable_amount': 0,
-                'cgst_amount': 0,
-                'sgst_amount': 0,
-                'total_gst_amount': 0
-            })
-
-            gst_summary_by_rate[gst_rate]['taxable_amount'] += discounted_price
-            gst_summary_by_rate[gst_rate]['cgst_amount'] += cgst_amount
-            gst_summary_by_rate[gst_rate]['sgst_amount'] += sgst_amount
-            gst_summary_by_rate[gst_rate]['total_gst_amount'] += (cgst_amount + sgst_amount)
-
-            total_taxable_amount += discounted_price
-            total_cgst_amount += cgst_amount
-            total_sgst_amount += sgst_amount
-            total_gst_amount += (cgst_amount + sgst_amount)
-            overall_grand_total += final_price
-
+        # Bill items, their products and the shopkeeper came with the bill
         template_data = {
-            'bill': bill,
-            'bill_items_data': bill_items_data,
-            'shopkeeper': shopkeeper,
-            'products': products_dict,
-            'gst_summary_by_rate': gst_summary_by_rate,
-            'total_taxable_amount': total_taxable_amount,
-            'total_cgst_amount': total_cgst_amount,
-            'total_sgst_amount': total_sgst_amount,
-            'total_gst_amount': total_gst_amount,
-            'overall_grand_total': overall_grand_total,
+            **ReceiptService.build_context(bill),
             'is_editable': is_editable,
             'back_url': back_url  # ✅ Correct dynamic back URL passed to template
         }
 
         if is_download:
-            from weasyprint import HTML
-            template_data['is_editable'] = False
-            html = render_template('shopkeeper/bill_receipt.html', **template_data)
-            pdf = HTML(string=html).write_pdf()
-            return send_file(
-                io.BytesIO(pdf),
-                download_name=f'bill_{bill.bill_number}.pdf',
-                mimetype='application/pdf'
-            )
+            def render_html():
+                return render_template('shopkeeper/bill_receipt.html', **dict(template_data, is_editable=False, for_pdf=True))
+
+            # Shares the shopkeeper's rendered PDF cache and render pool
+            return render_pool.pdf_response(bill, bill.shopkeeper.template_choice, render_html,
+                                            current_user.user_id,
+                                            busy_url=url_for('ca.view_bill', bill_id=bill.bill_id))
 
         return render_template('shopkeeper/bill_receipt.html', **template_data)
 
@@ -290,34 +215,31 @@ def register_routes(bp):
         bill.customer_name = customer_name
         bill.customer_contact = customer_contact
 
+        # Keep each product's billed GST snapshot across the re-insert
+        previous_items = {str(item.product_id): item for item in bill.bill_items if item.product_id}
+        products_by_id = InventoryService.get_products(bill.shopkeeper_id, item_ids)
+
         # Delete old items
         BillItem.query.filter_by(bill_id=bill.bill_id).delete()
 
-        total_base = 0
-        total_gst = 0
+        total_amount = 0
 
         for pid, qty, price in zip(item_ids, quantities, prices):
             qty = int(qty)
             price = float(price)
-            total_price = qty * price
 
-            bill_item = BillItem(
-                bill_id=bill.bill_id,
-                product_id=pid,
-                quantity=qty,
-                price_per_unit=price,
-                total_price=total_price
-            )
+            bill_item = BillItem(bill_id=bill.bill_id, product_id=pid)
+            previous = previous_items.get(str(pid))
+            if previous is not None and previous.gst_rate is not None:
+                for column in ('product_name', 'hsn_code', 'gst_rate', 'discount_percent'):
+                    setattr(bill_item, column, getattr(previous, column))
+            total_amount += BillService.restate_item(bill_item, qty, price, products_by_id.get(str(pid)))
             db.session.add(bill_item)
 
-            # GST calculation
-            product = Product.query.get(pid)
-            gst_rate = float(product.gst_rate or 0)
-            total_base += total_price
-            total_gst += (total_price * gst_rate / 100)
-
-        bill.total_amount = round(total_base + total_gst, 2)
+        bill.total_amount = round(total_amount, 2)
+        bill.version = (bill.version or 1) + 1
         db.session.commit()
+        PDFCache.invalidate_bill(bill.shopkeeper_id, bill.bill_id)
 
         flash("Bill updated successfully.", "success")
         print("Logged in as:", current_user.username, "Role:", current_user.role)
@@ -7,9 +7,9 @@ from flask_login import login_required, current_user
 from datetime import datetime
 from sqlalchemy import and_
 
-from app.models import (CharteredAccountant, CAConnection, CAEmployee, EmployeeClient, 
-                       Bill, Shopkeeper, GSTFilingStatus)
+from app.models import CharteredAccountant, CAConnection, Bill, Shopkeeper
 from app.extensions import db
+from app.shopkeeper.services import CAPortfolio
 
 
 def register_routes(bp):
@@ -43,9 +43,9 @@ def register_routes(bp):
         current_month_num = datetime.now().month
         
         # Basic metrics
-        total_clients = CAConnection.query.filter_by(ca_id=ca.ca_id, status='approved').count()
-        total_employees = CAEmployee.query.filter_by(ca_id=ca.ca_id).count()
-        pending_approvals = CAConnection.query.filter_by(ca_id=ca.ca_id, status='pending').count()
+        connection_counts = CAPortfolio.connection_counts(ca.ca_id)
+        total_clients = connection_counts['approved']
+        pending_approvals = connection_counts['pending']
         
         # Removed monthly revenue calculation
         
@@ -71,51 +71,12 @@ def register_routes(bp):
                 'payment_status': bill.payment_status
             })
         
-        # GST Filing Status for current month
-        connected_shopkeepers = db.session.query(Shopkeeper).join(
-            CAConnection, and_(
-                CAConnection.shopkeeper_id == Shopkeeper.shopkeeper_id,
-                CAConnection.ca_id == ca.ca_id,
-                CAConnection.status == 'approved'
-            )
-        ).all()
+        # GST Filing Status for current month (grouped queries, not one per client)
+        gst_summary = CAPortfolio.filing_summary(ca.ca_id, current_month)
         
-        gst_filed_count = 0
-        gst_pending_count = 0
-        gst_pending_clients = []
-        
-        for shopkeeper in connected_shopkeepers:
-            gst_status = GSTFilingStatus.query.filter_by(
-                shopkeeper_id=shopkeeper.shopkeeper_id,
-                month=current_month
-            ).first()
-            
-            if gst_status and gst_status.status == 'Filed':
-                gst_filed_count += 1
-            else:
-                gst_pending_count += 1
-                gst_pending_clients.append(shopkeeper)
-        
-        # Employee performance
-        employee_performance = []
-        employees = CAEmployee.query.filter_by(ca_id=ca.ca_id).all()
-        
-        for employee in employees:
-            # Count assigned clients
-            client_count = EmployeeClient.query.filter_by(employee_id=employee.employee_id).count()
-            
-            # Count GST filings done by this employee this month
-            gst_filed = GSTFilingStatus.query.filter_by(
-                employee_id=employee.employee_id,
-                month=current_month,
-                status='Filed'
-            ).count()
-            
-            employee_performance.append({
-                'name': employee.name,
-                'client_count': client_count,
-                'gst_filed': gst_filed
-            })
+        # Employee performance: assigned clients and this month's filings per employee
+        employee_performance = CAPortfolio.employee_workload(ca.ca_id, current_month)
+        total_employees = len(employee_performance)
         
         # Pending connection requests with shopkeeper details
         pending_connections_query = db.session.query(
@@ -146,9 +107,9 @@ def register_routes(bp):
 
             recent_bills=bills_data,
             current_month=datetime.now().strftime('%B %Y'),
-            gst_filed_count=gst_filed_count,
-            gst_pending_count=gst_pending_count,
-            gst_pending_clients=gst_pending_clients[:5],  # Show only first 5
+            gst_filed_count=gst_summary['filed_count'],
+            gst_pending_count=gst_summary['pending_count'],
+            gst_pending_clients=gst_summary['pending_clients'][:5],  # Show only first 5
             employee_performance=employee_performance,
             pending_connections=pending_connections
         )
\ No newline at end of file
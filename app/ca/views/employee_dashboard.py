@@ -5,12 +5,14 @@ Extracted from original routes.py - maintaining all original logic.
 from flask import render_template, redirect, url_for, request, flash, send_file
 from flask_login import login_required, current_user
 from datetime import datetime
-from sqlalchemy.orm import joinedload
 import io
 import pandas as pd
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
 from app.models import (CAEmployee, EmployeeClient, Shopkeeper, GSTFilingStatus)
 from app.extensions import db
+from app.shopkeeper.services import CAPortfolio, GSTReturnEngine, MonthlyStatement
 
 
 def register_routes(bp):
@@ -27,17 +29,18 @@ def register_routes(bp):
         # Get all clients assigned to this employee
         emp_clients = EmployeeClient.query.filter_by(employee_id=ca_employee.employee_id).all()
         client_ids = [ec.shopkeeper_id for ec in emp_clients]
-        clients = Shopkeeper.query.filter(Shopkeeper.shopkeeper_id.in_(client_ids)).all() if client_ids else []
-        # Filter by shop name if requested
+        # Filter by shop name if requested (in the query, so other clients' bills are never loaded)
         shop_filter = request.args.get('shop_filter', type=int)
-        if shop_filter:
-            clients = [c for c in clients if c.shopkeeper_id == shop_filter]
+        clients = []
+        if client_ids:
+            query = Shopkeeper.query.filter(Shopkeeper.shopkeeper_id.in_(client_ids))
+            if shop_filter:
+                query = query.filter(Shopkeeper.shopkeeper_id == shop_filter)
+            # The template lists every shown client's bills; load them in one query rather than one per client
+            clients = query.options(selectinload(Shopkeeper.bills)).all()
         # For each client, get GST status for current month
         current_month = datetime.now().strftime('%Y-%m')
-        gst_status_map = {}
-        for client in clients:
-            status_obj = GSTFilingStatus.query.filter_by(shopkeeper_id=client.shopkeeper_id, month=current_month).first()
-            gst_status_map[client.shopkeeper_id] = status_obj.status if status_obj else 'Not Filed'
+        gst_status_map = CAPortfolio.filing_statuses([c.shopkeeper_id for c in clients], current_month)
         return render_template('ca/employee_dashboard.html', clients=clients, gst_status_map=gst_status_map, current_month=current_month, shop_filter=shop_filter)
 
     @bp.route('/employee_client_dashboard/<int:shopkeeper_id>', methods=['GET', 'POST'])
@@ -47,8 +50,7 @@ def register_routes(bp):
         if current_user.role != 'employee':
             return redirect(url_for('ca.dashboard'))
         ca_employee = CAEmployee.query.filter_by(user_id=current_user.user_id).first()
-        # Use class-bound attribute for joinedload
-        shopkeeper = Shopkeeper.query.options(joinedload(Shopkeeper.bills)).get_or_404(shopkeeper_id)
+        shopkeeper = Shopkeeper.query.get_or_404(shopkeeper_id)
         # Only allow if this employee is assigned to this client
         emp_client = EmployeeClient.query.filter_by(employee_id=ca_employee.employee_id, shopkeeper_id=shopkeeper_id).first()
         if not emp_client:
@@ -62,22 +64,38 @@ def register_routes(bp):
             y = now.year - ((now.month - i - 1) // 12)
             months.append(f"{y}-{m:02d}")
         selected_month = request.args.get('month') or now.strftime('%Y-%m')
+        try:
+            MonthlyStatement.month_range(selected_month)
+        except ValueError:
+            selected_month = now.strftime('%Y-%m')
         # GST status for selected month
         gst_status_obj = GSTFilingStatus.query.filter_by(shopkeeper_id=shopkeeper_id, month=selected_month).first()
         gst_status = gst_status_obj.status if gst_status_obj else 'Not Filed'
         # Mark as Filed
         if request.method == 'POST' and request.form.get('action') == 'mark_filed':
+            if gst_status == 'Filed':
+                # Replayed POST: the month and its snapshot are already final
+                flash('GST status is already marked as Filed.', 'info')
+                return redirect(url_for('ca.employee_client_dashboard', shopkeeper_id=shopkeeper_id, month=selected_month))
             if not gst_status_obj:
                 gst_status_obj = GSTFilingStatus(shopkeeper_id=shopkeeper_id, employee_id=ca_employee.employee_id, month=selected_month, status='Filed', filed_at=datetime.now())
                 db.session.add(gst_status_obj)
             else:
                 gst_status_obj.status = 'Filed'
                 gst_status_obj.filed_at = datetime.now()
-            db.session.commit()
-            flash('GST status marked as Filed.', 'success')
+            # Freeze the month's GST return as filed; later loads read the snapshot
+            GSTReturnEngine.snapshot(shopkeeper_id, selected_month)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent request filed the month and stored its snapshot first
+                db.session.rollback()
+                flash('GST status is already marked as Filed.', 'info')
+            else:
+                flash('GST status marked as Filed.', 'success')
             return redirect(url_for('ca.employee_client_dashboard', shopkeeper_id=shopkeeper_id, month=selected_month))
-        # Bills for selected month
-        bills = [bill for bill in shopkeeper.bills if bill.bill_date.strftime('%Y-%m') == selected_month]
+        # Bills for selected month only (date-range query, not the shop's whole history)
+        bills = MonthlyStatement.month_bills_query(shopkeeper_id, selected_month).all()
         # Export bills to Excel
         if request.method == 'POST' and request.form.get('action') == 'export_excel':
             data = []
@@ -89,8 +107,9 @@ def register_routes(bp):
                 df.to_excel(writer, index=False, sheet_name='Bills')
             output.seek(0)
             return send_file(output, as_attachment=True, download_name=f'bills_{selected_month}.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        # Export bills to PDF (placeholder, implement as needed)
+        # Export the month's bills and items as one statement PDF
         if request.method == 'POST' and request.form.get('action') == 'export_pdf':
-            flash('PDF export not implemented yet.', 'info')
-            return redirect(url_for('ca.employee_client_dashboard', shopkeeper_id=shopkeeper_id, month=selected_month))
-        return render_template('ca/employee_client_dashboard.html', shopkeeper=shopkeeper, bills=bills, months=months, selected_month=selected_month, gst_status=gst_status)
\ No newline at end of file
+            pdf = MonthlyStatement.render_pdf(shopkeeper, selected_month)
+            return send_file(io.BytesIO(pdf), as_attachment=True, download_name=f'bills_{selected_month}.pdf', mimetype='application/pdf')
+        gst_return = GSTReturnEngine.summary(shopkeeper_id, selected_month)
+        return render_template('ca/employee_client_dashboard.html', shopkeeper=shopkeeper, bills=bills, months=months, selected_month=selected_month, gst_status=gst_status, gst_return=gst_return)
\ No newline at end of file
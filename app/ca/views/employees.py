@@ -12,6 +12,7 @@ from app.models import (CharteredAccountant, CAEmployee, EmployeeClient, Shopkee
                        CAConnection, User, GSTFilingStatus)
 from app.extensions import db
 from app.forms import EmployeeRegistrationForm, EmployeeEditForm
+from app.shopkeeper.services import DashboardCache
 
 
 def register_routes(bp):
@@ -97,7 +98,9 @@ def register_routes(bp):
             user = User.query.get(employee.user_id)
             
             # Delete employee clients first (due to foreign key constraints)
+            client_ids = [ec.shopkeeper_id for ec in EmployeeClient.query.filter_by(employee_id=employee_id)]
             EmployeeClient.query.filter_by(employee_id=employee_id).delete()
+            DashboardCache.mark_changed(client_ids)
             
             # Delete employee record
             db.session.delete(employee)
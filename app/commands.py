@@ -0,0 +1,59 @@
+"""
+Flask CLI commands (run with `flask <command>`).
+"""
+import click
+
+from .extensions import db
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's CLI."""
+
+    @app.cli.command('ingest-bills')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--shopkeeper-id', type=int, required=True, help='Shopkeeper the bills belong to.')
+    @click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), default=None,
+                  help='Input format (defaults to the file extension).')
+    @click.option('--batch-size', type=int, default=None, help='Bills per transaction.')
+    def ingest_bills(path, shopkeeper_id, fmt, batch_size):
+        """Bulk-ingest a JSON Lines or CSV file of bills."""
+        from .models import Shopkeeper
+        from .shopkeeper.services import BulkIngestService
+        from .shopkeeper.views.profile import bill_number_factory
+
+        shopkeeper = db.session.get(Shopkeeper, shopkeeper_id)
+        if shopkeeper is None:
+            raise click.ClickException(f'Shopkeeper {shopkeeper_id} not found')
+
+        fmt = fmt or BulkIngestService.detect_format(path)
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            stats = BulkIngestService.ingest(
+                shopkeeper,
+                BulkIngestService.read_records(stream, fmt),
+                bill_number_factory(shopkeeper),
+                batch_size=batch_size or app.config.get('BULK_INGEST_BATCH_SIZE', 200)
+            )
+
+        click.echo(f"Inserted {stats['bills_inserted']} bills ({stats['items_inserted']} items, "
+                   f"{stats['ledger_entries']} ledger entries) in {stats['elapsed_seconds']}s "
+                   f"- {stats['bills_per_second']} bills/sec")
+        for rejected in stats['rejected']:
+            click.echo(f"  line {rejected['line']}: {rejected['error']}", err=True)
+
+    @app.cli.command('backfill-bill-item-gst')
+    @click.option('--batch-size', type=int, default=1000, help='Items updated per transaction.')
+    def backfill_bill_item_gst(batch_size):
+        """Store the GST snapshot on bill items written before snapshots existed."""
+        from .shopkeeper.services import BillService
+
+        updated = BillService.backfill_gst_snapshots(batch_size=batch_size)
+        click.echo(f"Backfilled GST snapshot on {updated} bill items")
+
+    @app.cli.command('rebuild-sales-rollup')
+    @click.option('--shopkeeper-id', type=int, default=None, help='Only rebuild this shopkeeper (default: all).')
+    def rebuild_sales_rollup(shopkeeper_id):
+        """Recompute daily_sales_rollup from bills (backfill or repair)."""
+        from .shopkeeper.services import SalesRollupService
+
+        written = SalesRollupService.rebuild(shopkeeper_id=shopkeeper_id)
+        click.echo(f"Wrote {written} daily sales rollup rows")
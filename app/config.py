@@ -28,9 +28,47 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         'implicit_returning': False,  # Disable OUTPUT clause for SQL Server triggers
         'pool_pre_ping': True,        # Connection health check
-        'pool_recycle': 300           # Recycle connections every 5 minutes
+        'pool_recycle': 300,          # Recycle connections every 5 minutes
+        'fast_executemany': True      # pyodbc array binding for executemany (bulk ingest, backfills)
     }
     
+    # Inventory: refuse bills that would take stock below zero
+    STOCK_REJECT_INSUFFICIENT = os.environ.get('STOCK_REJECT_INSUFFICIENT', '0').lower() in ('1', 'true', 'yes')
+    
+    # Invoice numbers reserved per worker at a time (unused ones are skipped on restart)
+    INVOICE_NUMBER_BLOCK_SIZE = int(os.environ.get('INVOICE_NUMBER_BLOCK_SIZE', 10))
+    
+    # Bills written per transaction by bulk ingestion (API and flask ingest-bills; at most 500)
+    BULK_INGEST_BATCH_SIZE = int(os.environ.get('BULK_INGEST_BATCH_SIZE', 200))
+    
+    # Rendered invoice PDFs cached on local disk, trimmed least-recently-used first
+    PDF_CACHE_ENABLED = os.environ.get('PDF_CACHE_ENABLED', '1') != '0'
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(os.getcwd(), 'pdf_cache'))
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    
+    # Background PDF render processes per app worker (0 renders inline) and jobs each worker may queue
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_QUEUE_DEPTH = int(os.environ.get('PDF_RENDER_QUEUE_DEPTH', 8))
+    
+    # Render processes per app worker for CA bulk PDF (ZIP) exports
+    PDF_EXPORT_WORKERS = int(os.environ.get('PDF_EXPORT_WORKERS', 2))
+    
+    # Compiled Jinja templates kept on disk across restarts (empty disables)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', os.path.join(os.getcwd(), 'jinja_cache'))
+    
+    # Per-shopkeeper receipt header/footer fragments kept in memory per worker
+    RECEIPT_FRAGMENT_CACHE_SIZE = int(os.environ.get('RECEIPT_FRAGMENT_CACHE_SIZE', 1024))
+    
+    # Shopkeeper dashboard payload cache: 'sqlite' (file shared by the host's workers), 'memory'
+    # (per-worker LRU; only correct with a single worker) or empty to disable
+    DASHBOARD_CACHE_BACKEND = os.environ.get('DASHBOARD_CACHE_BACKEND', 'sqlite')
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 60))
+    DASHBOARD_CACHE_SIZE = int(os.environ.get('DASHBOARD_CACHE_SIZE', 512))
+    DASHBOARD_CACHE_PATH = os.environ.get('DASHBOARD_CACHE_PATH', os.path.join(os.getcwd(), 'dashboard_cache', 'dashboard.sqlite3'))
+    
+    # Bills per page on the manage bills list (keyset-paged, newest first)
+    MANAGE_BILLS_PAGE_SIZE = int(os.environ.get('MANAGE_BILLS_PAGE_SIZE', 50))
+
     # Session configuration
     SESSION_TYPE = 'filesystem'
     SESSION_FILE_DIR = os.path.join(os.getcwd(), 'flask_session')
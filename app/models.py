@@ -144,9 +144,18 @@ class Bill(db.Model):
     payment_status = db.Column(db.String(20), default='PAID')  # 'PAID', 'PARTIAL', 'UNPAID'
     paid_amount = db.Column(db.Numeric(10,2), default=0.00)  # Tracking payments
     due_amount = db.Column(db.Numeric(10,2), default=0.00)   # Tracking dues
+    idempotency_key = db.Column(db.String(64), nullable=True)  # Client retry key; replays return this bill
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped on every edit; keys cached PDFs
     # Relationships
     bill_items = db.relationship('BillItem', backref='bill', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('UX_bills_shopkeeper_idempotency', 'shopkeeper_id', 'idempotency_key', unique=True,
+                 mssql_where=db.text('idempotency_key IS NOT NULL'),
+                 sqlite_where=db.text('idempotency_key IS NOT NULL')),
+        db.Index('IX_bills_shopkeeper_date', 'shopkeeper_id', 'bill_date'),
+    )
+
 class BillItem(db.Model):
     """Items in a bill."""
     __tablename__ = 'bill_items'
@@ -159,6 +168,15 @@ class BillItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price_per_unit = db.Column(db.Numeric(10,2), nullable=False)
     total_price = db.Column(db.Numeric(12,2), nullable=False)
+    # GST snapshot taken when the bill is written; NULL on rows not yet backfilled
+    product_name = db.Column(db.String(100), nullable=True)
+    hsn_code = db.Column(db.String(20), nullable=True)
+    gst_rate = db.Column(db.Numeric(5,2), nullable=True)
+    discount_percent = db.Column(db.Numeric(5,2), nullable=True)
+    discount_amount = db.Column(db.Numeric(10,2), nullable=True)
+    taxable_value = db.Column(db.Numeric(12,2), nullable=True)
+    cgst_amount = db.Column(db.Numeric(10,2), nullable=True)
+    sgst_amount = db.Column(db.Numeric(10,2), nullable=True)
 
 class CAConnection(db.Model):
     """Connection between shopkeepers and CAs."""
@@ -192,6 +210,9 @@ class ShopConnection(db.Model):
 
 class GSTFilingStatus(db.Model):
     __tablename__ = 'gst_filing_status'
+    __table_args__ = (
+        db.Index('IX_gst_filing_shopkeeper_month', 'shopkeeper_id', 'month', mssql_include=['status']),
+    )
     id = db.Column(db.Integer, primary_key=True)
     shopkeeper_id = db.Column(db.Integer, db.ForeignKey('shopkeepers.shopkeeper_id', ondelete='CASCADE'), nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('ca_employees.employee_id', ondelete='SET NULL'))
@@ -201,6 +222,18 @@ class GSTFilingStatus(db.Model):
     shopkeeper = db.relationship('Shopkeeper', backref='gst_filing_statuses')
     employee = db.relationship('CAEmployee', backref='gst_filing_statuses')
 
+class GSTReturnSnapshot(db.Model):
+    """GST return summary of a shopkeeper-month, frozen when the month is marked Filed."""
+    __tablename__ = 'gst_return_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('shopkeeper_id', 'month', name='UQ_gst_return_snapshots_shopkeeper_month'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    shopkeeper_id = db.Column(db.Integer, db.ForeignKey('shopkeepers.shopkeeper_id', ondelete='CASCADE'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # Format: YYYY-MM
+    summary = db.Column(db.Text, nullable=False)  # JSON from GSTReturnEngine.compute
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
 class Customer(db.Model):
     """Customer model for shopkeeper's customer management."""
     __tablename__ = 'customers'
@@ -251,3 +284,22 @@ class CustomerLedger(db.Model):
     # Relationships
     shopkeeper = db.relationship('User')
     reference_bill = db.relationship('Bill')
+
+class InvoiceSequence(db.Model):
+    """Invoice number counter per shopkeeper, reserved in blocks by each worker."""
+    __tablename__ = 'invoice_sequences'
+    shopkeeper_id = db.Column(db.Integer, db.ForeignKey('shopkeepers.shopkeeper_id', ondelete='CASCADE'), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=1)  # First number not yet handed to any worker
+    reset_epoch = db.Column(db.Integer, nullable=False, default=0)  # Bumped by every reset; older blocks are dropped
+
+class DailySalesRollup(db.Model):
+    """Per-shopkeeper daily bill totals, kept in step with bills by SalesRollupService."""
+    __tablename__ = 'daily_sales_rollup'
+    shopkeeper_id = db.Column(db.Integer, db.ForeignKey('shopkeepers.shopkeeper_id', ondelete='CASCADE'), primary_key=True)
+    sales_date = db.Column(db.Date, primary_key=True)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    gross_total = db.Column(db.Numeric(14,2), nullable=False, default=0)  # Sum of bills.total_amount
+    paid_total = db.Column(db.Numeric(14,2), nullable=False, default=0)
+    due_total = db.Column(db.Numeric(14,2), nullable=False, default=0)
+    gst_total = db.Column(db.Numeric(14,2), nullable=False, default=0)  # CGST + SGST from bill item snapshots
+    updated_at = db.Column(db.DateTime, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
@@ -3,7 +3,25 @@ Services package for shopkeeper business logic.
 Contains pure business logic functions that don't depend on Flask.
 """
 from .bill_service import BillService
+from .bill_listing import BillListing
 from .customer_service import CustomerService
 from .report_service import ReportService
+from .dashboard_service import DashboardService
+from .sales_rollup import SalesRollupService
+from .sales_report_engine import SalesReportEngine
+from .dashboard_cache import DashboardCache
+from .inventory_service import InventoryService
+from .bill_pipeline import BillPipeline
+from .bulk_ingest import BulkIngestService
+from .gst_engine import GSTEngine
+from .receipt_fragments import ReceiptFragments
+from .receipt_service import ReceiptService
+from .pdf_cache import PDFCache
+from .pdf_renderer import PDFRenderer
+from .render_pool import PDFRenderPool, RenderQueueFull
+from .bulk_pdf_export import BulkPDFExport
+from .monthly_statement import MonthlyStatement
+from .ca_portfolio import CAPortfolio
+from .gst_return_engine import GSTReturnEngine
 
-__all__ = ['BillService', 'CustomerService', 'ReportService']
\ No newline at end of file
+__all__ = ['BillService', 'BillListing', 'CustomerService', 'ReportService', 'DashboardService', 'SalesRollupService', 'SalesReportEngine', 'DashboardCache', 'InventoryService', 'BillPipeline', 'BulkIngestService', 'GSTEngine', 'ReceiptService', 'ReceiptFragments', 'PDFCache', 'PDFRenderer', 'PDFRenderPool', 'RenderQueueFull', 'BulkPDFExport', 'MonthlyStatement', 'CAPortfolio', 'GSTReturnEngine']
\ No newline at end of file
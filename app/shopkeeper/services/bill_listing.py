@@ -0,0 +1,95 @@
+"""
+Bill list for the manage bills page.
+Bills are listed newest first on (bill_date, bill_id) and paged with a keyset
+cursor: the next page starts after the last row shown and the previous page
+before the first, so every page is an index seek on IX_bills_shopkeeper_date
+plus page_size rows, however deep into a shop's history it is. Only the
+columns the list shows are fetched, as plain rows rather than Bill objects.
+"""
+import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+from app.models import Bill
+from app.extensions import db
+
+# Bills per page of the manage bills list
+BILLS_PAGE_SIZE = 50
+LIST_COLUMNS = (Bill.bill_id, Bill.bill_number, Bill.customer_name, Bill.customer_contact, Bill.bill_date,
+                Bill.total_amount, Bill.paid_amount, Bill.due_amount, Bill.payment_status)
+
+
+class BillListing:
+    """Service class for the paged, filtered bill list."""
+
+    @staticmethod
+    def cursor(row) -> str:
+        """Cursor string for a listed row: '<bill_date>_<bill_id>'."""
+        return f"{row.bill_date:%Y-%m-%d}_{row.bill_id}"
+
+    @staticmethod
+    def parse_cursor(value: Optional[str]) -> Optional[Tuple[datetime.date, int]]:
+        """(bill_date, bill_id) from a cursor string; None when missing or malformed."""
+        if not value:
+            return None
+        try:
+            day, bill_id = value.split('_', 1)
+            return datetime.datetime.strptime(day, '%Y-%m-%d').date(), int(bill_id)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def page(shopkeeper_id: int, search: str = '', statuses: Iterable[str] = (),
+             start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None,
+             after: Optional[str] = None, before: Optional[str] = None,
+             page_size: int = BILLS_PAGE_SIZE) -> Dict:
+        """
+        One page of the shop's bills, newest first: the bills older than the
+        `after` cursor, or newer than `before`, or the newest when neither is
+        given. Returns the rows plus the cursors of the next (older) and
+        previous (newer) pages, None where there is no such page.
+        """
+        conditions = [Bill.shopkeeper_id == shopkeeper_id]
+        if search:
+            conditions.append(or_(Bill.bill_number.ilike(f'%{search}%'), Bill.customer_name.ilike(f'%{search}%')))
+        statuses = list(statuses)
+        if statuses:
+            conditions.append(Bill.payment_status.in_(statuses))
+        if start_date:
+            conditions.append(Bill.bill_date >= start_date)
+        if end_date:
+            conditions.append(Bill.bill_date <= end_date)
+
+        after_key = BillListing.parse_cursor(after)
+        before_key = BillListing.parse_cursor(before) if after_key is None else None
+        if before_key is not None:
+            # Newer rows: walk forwards from the cursor, then flip back to newest first
+            day, bill_id = before_key
+            conditions.append(or_(Bill.bill_date > day, and_(Bill.bill_date == day, Bill.bill_id > bill_id)))
+            order = (Bill.bill_date.asc(), Bill.bill_id.asc())
+        else:
+            if after_key is not None:
+                day, bill_id = after_key
+                conditions.append(or_(Bill.bill_date < day, and_(Bill.bill_date == day, Bill.bill_id < bill_id)))
+            order = (Bill.bill_date.desc(), Bill.bill_id.desc())
+
+        rows = db.session.execute(
+            select(*LIST_COLUMNS).where(*conditions).order_by(*order).limit(page_size + 1)
+        ).all()
+        if not rows and (after_key or before_key):
+            # The cursor's neighbours were deleted; start again from the newest bills
+            return BillListing.page(shopkeeper_id, search, statuses, start_date, end_date, page_size=page_size)
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if before_key is not None:
+            rows.reverse()
+            has_newer, has_older = more, True
+        else:
+            has_newer, has_older = after_key is not None, more
+
+        return {
+            'rows': rows,
+            'next_cursor': BillListing.cursor(rows[-1]) if rows and has_older else None,
+            'prev_cursor': BillListing.cursor(rows[0]) if rows and has_newer else None,
+        }
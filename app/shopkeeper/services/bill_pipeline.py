@@ -0,0 +1,305 @@
+"""
+Bill creation pipeline used by generate_bill_pdf.
+parse -> resolve customer -> compute totals -> persist bill, items, stock and
+ledger in one transaction with a single flush at commit time.
+"""
+import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Bill, BillItem, Customer, CustomerLedger
+from app.extensions import db
+from .inventory_service import InventoryService
+from .gst_engine import GSTEngine
+from .bill_service import BillService
+
+
+class BillPipeline:
+    """Stages of bill creation, run by BillPipeline.create_bill."""
+
+    @staticmethod
+    def find_replay(shopkeeper_id: int, idempotency_key: Optional[str]) -> Optional[Bill]:
+        """Return the bill already created with this idempotency key, if any."""
+        if not idempotency_key:
+            return None
+        return Bill.query.filter_by(shopkeeper_id=shopkeeper_id, idempotency_key=idempotency_key).first()
+
+    @staticmethod
+    def parse_form(form) -> Dict:
+        """Read the create-bill form into a plain request dict."""
+        bill_date_str = form.get('bill_date')
+        if bill_date_str:
+            bill_date = datetime.datetime.strptime(bill_date_str, '%Y-%m-%dT%H:%M')
+        else:
+            bill_date = datetime.datetime.now()
+
+        lines = []
+        for pid, product_name, qty, price, discount, custom_gst in zip(
+                form.getlist('product_id'), form.getlist('product_name'),
+                form.getlist('quantity'), form.getlist('price_per_unit'),
+                form.getlist('discount'), form.getlist('gst_rate')):
+            lines.append({
+                'product_id': pid.strip() if pid else '',
+                'product_name': (product_name or '').strip(),
+                'quantity': float(qty),
+                'price': float(price),
+                'discount': float(discount) if discount else 0,
+                'gst_rate': float(custom_gst) if custom_gst else 0,
+            })
+
+        customer_name = form.get('customer_name')
+        return {
+            'customer_type': form.get('customer_type', 'new'),
+            'existing_customer_id': form.get('existing_customer_id'),
+            'customer_name': customer_name,
+            'customer_contact': form.get('customer_contact'),
+            'customer_address': form.get('customer_address'),
+            'customer_gstin': form.get('customer_gstin'),
+            'save_as_customer': form.get('save_as_customer') == '1',
+            'payment_status': form.get('payment_status', 'Paid'),
+            'calculated_paid_amount': form.get('calculated_paid_amount', 0),
+            'calculated_unpaid_amount': form.get('calculated_unpaid_amount', 0),
+            'gst_mode': form.get('gst_mode', 'exclusive'),
+            'bill_gst_type': form.get('bill_gst_type', 'GST'),
+            'bill_gst_rate': float(form.get('bill_gst_rate', 0)),
+            'bill_date': bill_date,
+            'lines': lines,
+        }
+
+    @staticmethod
+    def wants_saved_customer(bill_request: Dict) -> bool:
+        """True when a new customer should be saved to the customer list."""
+        name = bill_request['customer_name']
+        return (bill_request['customer_type'] == 'new' and bill_request['save_as_customer']
+                and bool(name and name.strip()))
+
+    @staticmethod
+    def resolve_customer(shopkeeper, bill_request: Dict) -> Tuple[Optional[Customer], Optional[str]]:
+        """
+        Find or stage the bill's customer with at most one lookup and no flush.
+        Returns (customer, outcome) where outcome is 'existing', 'reused' or 'created'.
+        """
+        if bill_request['customer_type'] == 'existing' and bill_request['existing_customer_id']:
+            customer = Customer.query.filter_by(
+                customer_id=int(bill_request['existing_customer_id']),
+                shopkeeper_id=shopkeeper.user_id
+            ).first()
+            return customer, 'existing' if customer else None
+
+        if not BillPipeline.wants_saved_customer(bill_request):
+            return None, None
+
+        contact = (bill_request['customer_contact'] or '').strip()
+        if contact:
+            # Check for duplicate customer by phone number for this shopkeeper
+            customer = Customer.query.filter_by(shopkeeper_id=shopkeeper.user_id, phone=contact).first()
+            if customer:
+                return customer, 'reused'
+
+        customer = Customer(
+            shopkeeper_id=shopkeeper.user_id,  # Use shopkeeper.user_id per project convention
+            name=bill_request['customer_name'].strip(),
+            phone=contact,
+            email='',  # Email not captured in current form
+            address=(bill_request['customer_address'] or '').strip(),
+            is_active=True,
+            total_balance=0.00
+        )
+        db.session.add(customer)
+        return customer, 'created'
+
+    @staticmethod
+    def compute_totals(lines: List[Dict], products_by_id: Dict) -> Dict:
+        """Compute per-item GST and the bill's rate-wise summary."""
+        receipt_lines = []
+        for idx, line in enumerate(lines):
+            if line['product_id']:  # Existing product
+                product = products_by_id.get(line['product_id'])
+                if not product:
+                    continue
+                gst_rate = float(product.gst_rate or 0)
+                hsn_code = product.hsn_code or ''
+                is_custom = False
+            else:  # Custom product (no product_id)
+                if not line['product_name']:
+                    continue
+                gst_rate = line['gst_rate']
+                hsn_code = ''  # Can be extended to accept HSN from form
+                is_custom = True
+                # Mock product object so the receipt template can treat both alike
+                product = type('Product', (), {
+                    'product_name': line['product_name'],
+                    'gst_rate': gst_rate,
+                    'hsn_code': hsn_code,
+                    'product_id': f'custom_{idx}'
+                })()
+            receipt_lines.append({
+                'product': product,
+                'is_custom': is_custom,
+                'hsn_code': hsn_code,
+                'quantity': line['quantity'],
+                'price': line['price'],
+                'discount': line['discount'],
+                'gst_rate': gst_rate,
+            })
+        return GSTEngine.receipt_summary(receipt_lines)
+
+    @staticmethod
+    def resolve_payment(bill_request: Dict, customer: Optional[Customer], total: float) -> Tuple[str, float, float]:
+        """Return (payment_status, paid_amount, due_amount) for the bill total."""
+        # Guests (not saved) always pay in full; saved customers may owe a balance
+        payment_status = bill_request['payment_status'] if customer is not None else 'Paid'
+        try:
+            if payment_status == 'Paid':
+                return payment_status, total, 0
+            if payment_status == 'Unpaid':
+                return payment_status, 0, total
+            return (payment_status, float(bill_request['calculated_paid_amount']),
+                    float(bill_request['calculated_unpaid_amount']))
+        except (ValueError, TypeError):
+            return payment_status, 0, 0
+
+    @staticmethod
+    def build_ledger_entries(shopkeeper, customer: Customer, bill: Bill,
+                             total: float, paid_amount: float) -> List[CustomerLedger]:
+        """Purchase (and payment) ledger rows for a credit bill; updates the balance."""
+        debit_amount = Decimal(str(total))
+        credit_amount = Decimal(str(paid_amount))
+        current_balance = customer.total_balance or Decimal('0')
+        new_balance = current_balance + debit_amount - credit_amount
+
+        entries = [CustomerLedger(
+            customer=customer,
+            shopkeeper_id=shopkeeper.user_id,
+            invoice_no=bill.bill_number,
+            particulars=f"Bill Purchase - {bill.bill_number}",
+            debit_amount=debit_amount,
+            credit_amount=0,
+            balance_amount=current_balance + debit_amount,
+            transaction_type='PURCHASE',
+            reference_bill=bill,
+            notes=f"Products purchased via bill {bill.bill_number}"
+        )]
+        if credit_amount > 0:
+            entries.append(CustomerLedger(
+                customer=customer,
+                shopkeeper_id=shopkeeper.user_id,
+                invoice_no=f"PAY-{bill.bill_number}",
+                particulars=f"Payment for Bill {bill.bill_number}",
+                debit_amount=0,
+                credit_amount=credit_amount,
+                balance_amount=new_balance,
+                transaction_type='PAYMENT',
+                reference_bill=bill,
+                notes=f"Partial payment for bill {bill.bill_number}"
+            ))
+
+        customer.total_balance = new_balance
+        customer.updated_date = datetime.datetime.now()
+        return entries
+
+    @staticmethod
+    def create_bill(shopkeeper, form, bill_number: str, reject_if_insufficient: bool = False,
+                    idempotency_key: Optional[str] = None) -> Tuple[Dict, bool]:
+        """
+        Run the whole pipeline in one transaction.
+        Returns (result, success_flag); on failure result holds 'error' and
+        'failed_items', and nothing has been written. When a concurrent request
+        with the same idempotency key wins the race, result holds 'replayed'
+        and the original bill instead.
+        """
+        bill_request = BillPipeline.parse_form(form)
+        products_by_id = InventoryService.get_products(
+            shopkeeper.shopkeeper_id, [line['product_id'] for line in bill_request['lines']]
+        )
+
+        try:
+            totals = BillPipeline.compute_totals(bill_request['lines'], products_by_id)
+
+            # Stock first, while nothing is pending in the session: the conditional
+            # UPDATE is the only step that can reject the bill
+            stock_decrements = {}
+            for computed in totals['lines']:
+                if not computed['is_custom']:
+                    product_id = computed['product'].product_id
+                    stock_decrements[product_id] = stock_decrements.get(product_id, 0) + int(computed['quantity'])
+            stock_ok, failed_items = InventoryService.decrement_stock(
+                shopkeeper.shopkeeper_id, stock_decrements, reject_if_insufficient=reject_if_insufficient
+            )
+            if not stock_ok and reject_if_insufficient:
+                db.session.rollback()
+                return {'error': 'insufficient_stock', 'failed_items': failed_items,
+                        'products': products_by_id}, False
+
+            customer, customer_outcome = BillPipeline.resolve_customer(shopkeeper, bill_request)
+            total = totals['overall_grand_total']
+            payment_status, paid_amount, due_amount = BillPipeline.resolve_payment(bill_request, customer, total)
+
+            bill = Bill(
+                shopkeeper_id=shopkeeper.shopkeeper_id,
+                customer=customer,
+                bill_number=bill_number,
+                customer_name=bill_request['customer_name'],
+                customer_contact=bill_request['customer_contact'],
+                customer_address=bill_request['customer_address'],
+                customer_gstin=bill_request['customer_gstin'],
+                bill_date=bill_request['bill_date'],
+                gst_type=bill_request['bill_gst_type'],
+                total_amount=total,
+                payment_status=payment_status,
+                paid_amount=paid_amount,
+                due_amount=due_amount,
+                idempotency_key=idempotency_key
+            )
+            for computed in totals['lines']:
+                if computed['is_custom']:
+                    bill.bill_items.append(BillItem(
+                        product_id=None,  # No product_id for custom products
+                        custom_product_name=computed['product'].product_name,
+                        custom_gst_rate=computed['gst_rate'],
+                        custom_hsn_code=computed['hsn_code'],
+                        quantity=computed['quantity'],
+                        price_per_unit=computed['base_price'],
+                        total_price=computed['final_price'],
+                        **BillService.snapshot_fields(computed)
+                    ))
+                else:
+                    bill.bill_items.append(BillItem(
+                        product_id=computed['product'].product_id,
+                        quantity=computed['quantity'],
+                        price_per_unit=computed['base_price'],
+                        total_price=computed['final_price'],
+                        **BillService.snapshot_fields(computed)
+                    ))
+            db.session.add(bill)
+
+            # Ledger entries for customers with unpaid/partial amounts
+            if customer is not None and payment_status in ('Unpaid', 'Partial'):
+                db.session.add_all(BillPipeline.build_ledger_entries(
+                    shopkeeper, customer, bill, total, paid_amount
+                ))
+
+            # Single flush: customer, bill, items and ledger rows go out together
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            original = BillPipeline.find_replay(shopkeeper.shopkeeper_id, idempotency_key)
+            if original is None:
+                raise
+            return {'bill': original, 'replayed': True}, True
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {
+            'bill': bill,
+            'bill_request': bill_request,
+            'totals': totals,
+            'products': products_by_id,
+            'customer_outcome': customer_outcome,
+            'payment_status': payment_status,
+            'paid_amount': paid_amount,
+            'due_amount': due_amount,
+        }, True
@@ -6,8 +6,12 @@ from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import bindparam, select, update
+
 from app.models import Bill, BillItem, Product, Customer, CustomerLedger
 from app.extensions import db
+from .inventory_service import InventoryService
+from .gst_engine import GSTEngine
 
 
 class BillService:
@@ -24,53 +28,174 @@ class BillService:
     def calculate_item_totals(price: Decimal, quantity: int, gst_rate: Decimal, 
                             discount_percent: Decimal = Decimal('0')) -> Dict[str, Decimal]:
         """Calculate all amounts for a bill item."""
-        # Basic calculations
-        subtotal = price * Decimal(str(quantity))
-        discount_amount = (subtotal * discount_percent / Decimal('100')).quantize(
-            Decimal('0.01'), rounding=ROUND_HALF_UP
-        )
-        discounted_subtotal = subtotal - discount_amount
-        
-        # GST calculations
-        gst_amount = BillService.calculate_gst_amount(discounted_subtotal, gst_rate)
-        total_with_gst = discounted_subtotal + gst_amount
-        
+        columns = GSTEngine.compute_batch([quantity], [price], [discount_percent], [gst_rate], mode='decimal')
         return {
-            'subtotal': subtotal,
-            'discount_amount': discount_amount,
-            'discounted_subtotal': discounted_subtotal,
-            'gst_amount': gst_amount,
-            'total_with_gst': total_with_gst
+            'subtotal': columns['total_base_price'][0],
+            'discount_amount': columns['discount_amount'][0],
+            'discounted_subtotal': columns['discounted_price'][0],
+            'gst_amount': columns['total_gst_amount'][0],
+            'total_with_gst': columns['final_price'][0]
         }
     
     @staticmethod
     def calculate_bill_totals(bill_items: List[Dict]) -> Dict[str, Decimal]:
         """Calculate total amounts for entire bill."""
-        subtotal = Decimal('0')
-        total_discount = Decimal('0')
-        total_gst = Decimal('0')
-        final_total = Decimal('0')
-        
-        for item in bill_items:
-            item_totals = BillService.calculate_item_totals(
-                Decimal(str(item['price'])),
-                int(item['quantity']),
-                Decimal(str(item.get('gst_rate', 0))),
-                Decimal(str(item.get('discount_percent', 0)))
-            )
-            
-            subtotal += item_totals['subtotal']
-            total_discount += item_totals['discount_amount']
-            total_gst += item_totals['gst_amount']
-            final_total += item_totals['total_with_gst']
-        
+        columns = GSTEngine.compute_batch(
+            [int(item['quantity']) for item in bill_items],
+            [item['price'] for item in bill_items],
+            [item.get('discount_percent', 0) for item in bill_items],
+            [item.get('gst_rate', 0) for item in bill_items],
+            mode='decimal'
+        )
         return {
-            'subtotal': subtotal,
-            'total_discount': total_discount,
-            'total_gst': total_gst,
-            'final_total': final_total
+            'subtotal': sum(columns['total_base_price'], Decimal('0')),
+            'total_discount': sum(columns['discount_amount'], Decimal('0')),
+            'total_gst': sum(columns['total_gst_amount'], Decimal('0')),
+            'final_total': sum(columns['final_price'], Decimal('0'))
         }
     
+    @staticmethod
+    def snapshot_fields(line: Dict) -> Dict:
+        """BillItem GST snapshot columns for a line computed by GSTEngine.receipt_summary."""
+        return {
+            'product_name': line['product'].product_name,
+            'hsn_code': line['hsn_code'] or None,
+            'gst_rate': line['gst_rate'],
+            'discount_percent': line.get('discount', 0) or 0,
+            'discount_amount': round(float(line['discount_amount']), 2),
+            'taxable_value': round(float(line['discounted_price']), 2),
+            'cgst_amount': round(float(line['cgst_amount']), 2),
+            'sgst_amount': round(float(line['sgst_amount']), 2),
+        }
+
+    @staticmethod
+    def restate_item(bill_item: BillItem, quantity: int, price: float, product: Optional[Product] = None) -> float:
+        """
+        Set a new quantity/price on an item and refresh its GST snapshot.
+        The item keeps the rate, discount and HSN it was billed with; the product
+        only fills them in for items that were never snapshotted.
+        Returns the new line total including GST.
+        """
+        if bill_item.gst_rate is not None:
+            gst_rate, hsn_code = float(bill_item.gst_rate), bill_item.hsn_code or ''
+            name = bill_item.product_name
+        elif product is not None:
+            gst_rate, hsn_code, name = float(product.gst_rate or 0), product.hsn_code or '', product.product_name
+        else:
+            gst_rate, hsn_code = float(bill_item.custom_gst_rate or 0), bill_item.custom_hsn_code or ''
+            name = bill_item.custom_product_name
+
+        line = GSTEngine.receipt_summary([{
+            'product': type('Product', (), {'product_name': name}),
+            'hsn_code': hsn_code,
+            'quantity': quantity,
+            'price': price,
+            'discount': float(bill_item.discount_percent or 0),
+            'gst_rate': gst_rate,
+        }])['lines'][0]
+        bill_item.quantity = quantity
+        bill_item.price_per_unit = price
+        bill_item.total_price = line['final_price']
+        for column, value in BillService.snapshot_fields(line).items():
+            setattr(bill_item, column, value)
+        return line['final_price']
+
+    @staticmethod
+    def receipt_lines(bill_items: List[BillItem], products_by_id: Dict) -> List[Dict]:
+        """Turn stored bill items into GSTEngine lines for the receipt template."""
+        lines = []
+        for item in bill_items:
+            if item.gst_rate is not None:  # Snapshot taken when the bill was written
+                gst_rate = float(item.gst_rate)
+                hsn_code = item.hsn_code or ''
+                is_custom = item.product_id is None
+                discount = float(item.discount_percent or 0)
+                product = type('Product', (), {
+                    'product_name': item.product_name,
+                    'gst_rate': gst_rate,
+                    'hsn_code': hsn_code,
+                    'product_id': item.product_id if not is_custom else f'custom_{item.bill_item_id}'
+                })()
+            # Rows not yet backfilled: fall back to the catalog
+            elif item.product_id:  # Existing product
+                product = products_by_id.get(str(item.product_id))
+                if not product:
+                    continue  # Skip if product not found
+                gst_rate = float(product.gst_rate or 0)
+                hsn_code = product.hsn_code or ''
+                is_custom = False
+                discount = 0  # Discount was not stored before snapshots
+            else:  # Custom product
+                gst_rate = float(item.custom_gst_rate or 0)
+                hsn_code = item.custom_hsn_code or ''
+                is_custom = True
+                discount = 0
+                # Mock product object so the receipt template can treat both alike
+                product = type('Product', (), {
+                    'product_name': item.custom_product_name,
+                    'gst_rate': gst_rate,
+                    'hsn_code': hsn_code,
+                    'product_id': f'custom_{item.bill_item_id}'
+                })()
+            lines.append({
+                'product': product,
+                'is_custom': is_custom,
+                'hsn_code': hsn_code,
+                'quantity': int(item.quantity),
+                'price': float(item.price_per_unit),
+                'discount': discount,
+                'gst_rate': gst_rate,
+            })
+        return lines
+
+    @staticmethod
+    def backfill_gst_snapshots(batch_size: int = 1000) -> int:
+        """
+        Fill the GST snapshot on bill items written before snapshots existed.
+        Uses the current product rate/HSN (custom items use their own) and no
+        discount, i.e. exactly what receipts showed for these rows so far.
+        Works in keyset batches, one executemany UPDATE and commit per batch.
+        Returns the number of items updated.
+        """
+        updated = 0
+        last_id = 0
+        stmt = update(BillItem.__table__).where(BillItem.__table__.c.bill_item_id == bindparam('b_bill_item_id'))
+        while True:
+            rows = db.session.execute(
+                select(BillItem.bill_item_id, BillItem.product_id, BillItem.quantity, BillItem.price_per_unit,
+                       BillItem.custom_product_name, BillItem.custom_gst_rate, BillItem.custom_hsn_code,
+                       Product.product_name, Product.gst_rate, Product.hsn_code)
+                .outerjoin(Product, Product.product_id == BillItem.product_id)
+                .where(BillItem.gst_rate.is_(None), BillItem.bill_item_id > last_id)
+                .order_by(BillItem.bill_item_id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+
+            rates = [float((row.custom_gst_rate if row.product_id is None else row.gst_rate) or 0) for row in rows]
+            columns = GSTEngine.compute_batch([row.quantity for row in rows],
+                                              [row.price_per_unit for row in rows],
+                                              None, rates, mode='decimal')
+            params = []
+            for idx, row in enumerate(rows):
+                custom = row.product_id is None
+                params.append({
+                    'b_bill_item_id': row.bill_item_id,
+                    'product_name': row.custom_product_name if custom else row.product_name,
+                    'hsn_code': (row.custom_hsn_code if custom else row.hsn_code) or None,
+                    'gst_rate': rates[idx],
+                    'discount_percent': 0,
+                    'discount_amount': columns['discount_amount'][idx],
+                    'taxable_value': columns['discounted_price'][idx],
+                    'cgst_amount': columns['cgst_amount'][idx],
+                    'sgst_amount': columns['sgst_amount'][idx],
+                })
+            db.session.connection().execute(stmt, params)
+            db.session.commit()
+            updated += len(params)
+            last_id = rows[-1].bill_item_id
+    
     @staticmethod
     def create_bill(shopkeeper_id: int, bill_data: Dict, bill_items: List[Dict]) -> Tuple[Bill, bool]:
         """
@@ -103,6 +228,7 @@ class BillService:
             db.session.flush()  # Get bill ID
             
             # Create bill items and update inventory
+            stock_decrements = {}
             for item_data in bill_items:
                 item_totals = BillService.calculate_item_totals(
                     Decimal(str(item_data['price'])),
@@ -127,12 +253,18 @@ class BillService:
                 
                 db.session.add(bill_item)
                 
-                # Update product inventory if it's an existing product
+                # Collect inventory changes for existing products
                 if 'product_id' in item_data and item_data['product_id']:
-                    product = Product.query.get(item_data['product_id'])
-                    if product and product.stock_quantity >= int(item_data['quantity']):
-                        product.stock_quantity -= int(item_data['quantity'])
-                        db.session.add(product)
+                    product_id = int(item_data['product_id'])
+                    stock_decrements[product_id] = stock_decrements.get(product_id, 0) + int(item_data['quantity'])
+            
+            # Conditional in-database decrement; the bill fails if any item is short
+            stock_ok, _ = InventoryService.decrement_stock(
+                shopkeeper_id, stock_decrements, reject_if_insufficient=True
+            )
+            if not stock_ok:
+                db.session.rollback()
+                return None, False
             
             # Handle customer ledger if customer exists
             if bill_data.get('customer_id'):
@@ -0,0 +1,368 @@
+"""
+Bulk bill ingestion for back-filling bills from offline terminals.
+Bills arrive as JSON Lines (one bill per line) or CSV (one item per row,
+grouped by bill_ref). Each batch is written with executemany inserts (array
+bound by pyodbc's fast_executemany, set on the engine in Config) and set-wise
+stock and customer balance updates, then committed once.
+"""
+import csv
+import io
+import json
+import time
+import datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case, insert, select, update
+
+from app.models import Bill, BillItem, Customer, CustomerLedger
+from app.extensions import db
+from .bill_pipeline import BillPipeline
+from .bill_service import BillService
+from .dashboard_cache import DashboardCache
+from .inventory_service import InventoryService
+from .sales_rollup import SalesRollupService
+
+
+BILL_FIELDS = ('bill_number', 'bill_date', 'customer_id', 'customer_name', 'customer_contact',
+               'customer_address', 'customer_gstin', 'gst_type', 'payment_status', 'paid_amount')
+ITEM_FIELDS = ('product_id', 'product_name', 'quantity', 'price_per_unit', 'discount', 'gst_rate')
+# Times a generated bill number that clashes with an existing bill is replaced before giving up
+BILL_NUMBER_ATTEMPTS = 5
+# Largest batch: the per-batch IN lists (bill numbers, customers) must stay
+# well under SQL Server's 2100 parameters per statement
+MAX_BATCH_SIZE = 500
+
+
+class BulkIngestService:
+    """Service class for batched bill ingestion."""
+
+    @staticmethod
+    def read_records(stream, fmt: str) -> Iterator[Tuple[int, Dict]]:
+        """
+        Yield (line_number, bill_dict) from a text stream.
+        CSV rows sharing a bill_ref (or bill_number) become one bill.
+        """
+        if fmt == 'jsonl':
+            for line_no, line in enumerate(stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError as e:
+                    yield line_no, {'_error': f'Invalid JSON: {e}'}
+            return
+
+        if fmt != 'csv':
+            raise ValueError(f'Unsupported format: {fmt}')
+
+        current_ref, current, first_line = None, None, None
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            ref = row.get('bill_ref') or row.get('bill_number')
+            if current is None or ref != current_ref:
+                if current is not None:
+                    yield first_line, current
+                current_ref, first_line = ref, line_no
+                current = {field: row.get(field) for field in BILL_FIELDS}
+                current['items'] = []
+            current['items'].append({field: row.get(field) for field in ITEM_FIELDS})
+        if current is not None:
+            yield first_line, current
+
+    @staticmethod
+    def parse_record(record: Dict) -> Dict:
+        """Validate one bill record into the shape BillPipeline works with."""
+        if '_error' in record:
+            raise ValueError(record['_error'])
+        items = record.get('items') or []
+        if not items:
+            raise ValueError('Bill has no items')
+
+        bill_date = record.get('bill_date')
+        if bill_date:
+            bill_date = datetime.datetime.fromisoformat(str(bill_date).strip())
+        else:
+            bill_date = datetime.datetime.now()
+
+        lines = []
+        for item in items:
+            pid = item.get('product_id')
+            lines.append({
+                'product_id': str(pid).strip() if pid not in (None, '') else '',
+                'product_name': (item.get('product_name') or '').strip(),
+                'quantity': float(item.get('quantity') or 0),
+                'price': float(item.get('price_per_unit') or 0),
+                'discount': float(item.get('discount') or 0),
+                'gst_rate': float(item.get('gst_rate') or 0),
+            })
+
+        customer_id = record.get('customer_id')
+        return {
+            'bill_number': (record.get('bill_number') or '').strip() or None,
+            'bill_date': bill_date,
+            'customer_id': int(customer_id) if customer_id not in (None, '') else None,
+            'customer_name': record.get('customer_name'),
+            'customer_contact': record.get('customer_contact'),
+            'customer_address': record.get('customer_address'),
+            'customer_gstin': record.get('customer_gstin'),
+            'gst_type': record.get('gst_type') or 'GST',
+            'payment_status': record.get('payment_status') or 'Paid',
+            'paid_amount': float(record.get('paid_amount') or 0),
+            'lines': lines,
+        }
+
+    @staticmethod
+    def ingest(shopkeeper, records: Iterable[Tuple[int, Dict]],
+               next_bill_number: Callable[[], str], batch_size: int = 200) -> Dict:
+        """
+        Ingest bill records in batches. Invalid records and bill numbers that
+        already exist are reported and skipped; every valid batch is committed.
+        Returns counts, rejected records and throughput in bills per second.
+        batch_size is capped at MAX_BATCH_SIZE.
+        """
+        batch_size = max(1, min(int(batch_size), MAX_BATCH_SIZE))
+        started = time.perf_counter()
+        stats = {'bills_inserted': 0, 'items_inserted': 0, 'ledger_entries': 0, 'rejected': []}
+
+        batch = []
+        for line_no, record in records:
+            try:
+                batch.append((line_no, BulkIngestService.parse_record(record)))
+            except (ValueError, TypeError) as e:
+                stats['rejected'].append({'line': line_no, 'error': str(e)})
+                continue
+            if len(batch) >= batch_size:
+                BulkIngestService._ingest_batch(shopkeeper, batch, next_bill_number, stats)
+                batch = []
+        if batch:
+            BulkIngestService._ingest_batch(shopkeeper, batch, next_bill_number, stats)
+
+        elapsed = time.perf_counter() - started
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['bills_per_second'] = round(stats['bills_inserted'] / elapsed, 1) if elapsed > 0 else 0.0
+        return stats
+
+    @staticmethod
+    def _ingest_batch(shopkeeper, batch: List[Tuple[int, Dict]],
+                      next_bill_number: Callable[[], str], stats: Dict):
+        """Write one batch of parsed bills in a single transaction."""
+        # Skip bill numbers that were already ingested (nightly replays) or repeat in the batch
+        numbers = [bill['bill_number'] for _, bill in batch if bill['bill_number']]
+        existing_numbers = set()
+        if numbers:
+            existing_numbers = set(db.session.execute(
+                select(Bill.bill_number).where(
+                    Bill.shopkeeper_id == shopkeeper.shopkeeper_id,
+                    Bill.bill_number.in_(numbers)
+                )
+            ).scalars())
+
+        accepted = []
+        for line_no, bill in batch:
+            if bill['bill_number'] in existing_numbers:
+                stats['rejected'].append({'line': line_no, 'error': f"Bill {bill['bill_number']} already exists"})
+                continue
+            if bill['bill_number']:
+                existing_numbers.add(bill['bill_number'])
+            accepted.append((line_no, bill))
+        if not accepted:
+            return
+
+        products_by_id = InventoryService.get_products(
+            shopkeeper.shopkeeper_id,
+            {line['product_id'] for _, bill in accepted for line in bill['lines']}
+        )
+        customer_ids = {bill['customer_id'] for _, bill in accepted if bill['customer_id']}
+        customers = {}
+        if customer_ids:
+            customers = {c.customer_id: c for c in Customer.query.filter(
+                Customer.shopkeeper_id == shopkeeper.user_id,
+                Customer.customer_id.in_(customer_ids)
+            ).all()}
+
+        try:
+            bill_rows, bill_lines, generated, stock_decrements = [], [], [], {}
+            for line_no, bill in accepted:
+                totals = BillPipeline.compute_totals(bill['lines'], products_by_id)
+                if not totals['lines']:
+                    stats['rejected'].append({'line': line_no, 'error': 'No valid items'})
+                    continue
+                customer = customers.get(bill['customer_id'])
+                total = totals['overall_grand_total']
+                payment_status = bill['payment_status'] if customer is not None else 'Paid'
+                if payment_status == 'Paid':
+                    paid_amount, due_amount = total, 0
+                elif payment_status == 'Unpaid':
+                    paid_amount, due_amount = 0, total
+                else:
+                    paid_amount, due_amount = bill['paid_amount'], total - bill['paid_amount']
+
+                bill.update(customer=customer, total=total, payment_status=payment_status, paid_amount=paid_amount)
+                if not bill['bill_number']:
+                    generated.append(len(bill_rows))
+                bill_rows.append({
+                    'shopkeeper_id': shopkeeper.shopkeeper_id,
+                    'customer_id': customer.customer_id if customer is not None else None,
+                    'bill_number': bill['bill_number'],
+                    'customer_name': bill['customer_name'],
+                    'customer_contact': bill['customer_contact'],
+                    'customer_address': bill['customer_address'],
+                    'customer_gstin': bill['customer_gstin'],
+                    'bill_date': bill['bill_date'],
+                    'gst_type': bill['gst_type'],
+                    'total_amount': total,
+                    'payment_status': payment_status,
+                    'paid_amount': paid_amount,
+                    'due_amount': due_amount,
+                })
+                bill_lines.append((bill, totals['lines']))
+                for computed in totals['lines']:
+                    if not computed['is_custom']:
+                        product_id = computed['product'].product_id
+                        stock_decrements[product_id] = stock_decrements.get(product_id, 0) + int(computed['quantity'])
+            if not bill_rows:
+                return
+            BulkIngestService._assign_bill_numbers(shopkeeper.shopkeeper_id, bill_rows, generated,
+                                                   next_bill_number, existing_numbers)
+            for row, (bill, _) in zip(bill_rows, bill_lines):
+                bill['bill_number'] = row['bill_number']
+
+            # Offline sales already happened: decrement stock even below zero
+            InventoryService.decrement_stock(shopkeeper.shopkeeper_id, stock_decrements)
+
+            conn = db.session.connection()
+            conn.execute(insert(Bill), bill_rows)
+
+            # Identity values are not returned by executemany; read them back by bill number,
+            # which the checks above made unique for the shop
+            bill_ids = {}
+            for number, bill_id in conn.execute(
+                select(Bill.bill_number, Bill.bill_id).where(
+                    Bill.shopkeeper_id == shopkeeper.shopkeeper_id,
+                    Bill.bill_number.in_([row['bill_number'] for row in bill_rows])
+                )
+            ):
+                if number in bill_ids:
+                    # Written concurrently by another request; items could land on the wrong bill
+                    raise ValueError(f"Bill {number} was created by another request during ingestion")
+                bill_ids[number] = bill_id
+
+            item_rows, ledger_rows, balances = [], [], {}
+            for row, (bill, computed_lines) in zip(bill_rows, bill_lines):
+                bill_id = bill_ids[row['bill_number']]
+                for computed in computed_lines:
+                    item_rows.append({
+                        'bill_id': bill_id,
+                        'product_id': None if computed['is_custom'] else computed['product'].product_id,
+                        'custom_product_name': computed['product'].product_name if computed['is_custom'] else None,
+                        'custom_gst_rate': computed['gst_rate'] if computed['is_custom'] else None,
+                        'custom_hsn_code': computed['hsn_code'] if computed['is_custom'] else None,
+                        'quantity': computed['quantity'],
+                        'price_per_unit': computed['base_price'],
+                        'total_price': computed['final_price'],
+                        **BillService.snapshot_fields(computed),
+                    })
+                customer = bill['customer']
+                if customer is not None and bill['payment_status'] in ('Unpaid', 'Partial'):
+                    ledger_rows.extend(BulkIngestService._ledger_rows(
+                        shopkeeper, customer, bill_id, bill, balances
+                    ))
+
+            conn.execute(insert(BillItem), item_rows)
+            if ledger_rows:
+                conn.execute(insert(CustomerLedger), ledger_rows)
+                conn.execute(
+                    update(Customer)
+                    .where(Customer.customer_id.in_(list(balances)))
+                    .values(total_balance=case(balances, value=Customer.customer_id),
+                            updated_date=datetime.datetime.now())
+                )
+
+            # Core inserts bypass the ORM flush hooks
+            SalesRollupService.mark_changed(shopkeeper.shopkeeper_id, {row['bill_date'] for row in bill_rows})
+            DashboardCache.mark_changed([shopkeeper.shopkeeper_id])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        stats['bills_inserted'] += len(bill_rows)
+        stats['items_inserted'] += len(item_rows)
+        stats['ledger_entries'] += len(ledger_rows)
+
+    @staticmethod
+    def _assign_bill_numbers(shopkeeper_id: int, bill_rows: List[Dict], generated: List[int],
+                             next_bill_number: Callable[[], str], taken: set):
+        """
+        Give the rows at the `generated` positions a bill number from
+        next_bill_number(), replacing any that already exist for the shop
+        (e.g. after invoice numbering was reset) or repeat within the batch.
+        `taken` holds the batch's supplied numbers and is updated in place.
+        """
+        pending = list(generated)
+        for _ in range(BILL_NUMBER_ATTEMPTS):
+            if not pending:
+                return
+            for idx in pending:
+                bill_rows[idx]['bill_number'] = next_bill_number()
+            numbers = [bill_rows[idx]['bill_number'] for idx in pending]
+            clashes = set(db.session.execute(
+                select(Bill.bill_number).where(Bill.shopkeeper_id == shopkeeper_id, Bill.bill_number.in_(numbers))
+            ).scalars())
+            retry = []
+            for idx in pending:
+                number = bill_rows[idx]['bill_number']
+                if number in clashes or number in taken:
+                    retry.append(idx)
+                else:
+                    taken.add(number)
+            pending = retry
+        if pending:
+            raise ValueError(f"Could not generate an unused bill number after {BILL_NUMBER_ATTEMPTS} attempts")
+
+    @staticmethod
+    def _ledger_rows(shopkeeper, customer, bill_id: int, bill: Dict,
+                     balances: Dict[int, Decimal]) -> List[Dict]:
+        """Purchase/payment ledger rows for one credit bill, carrying the running balance."""
+        now = datetime.datetime.utcnow()
+        bill_number = bill['bill_number']
+        debit_amount = Decimal(str(bill['total']))
+        credit_amount = Decimal(str(bill['paid_amount']))
+        current_balance = balances.get(customer.customer_id, customer.total_balance or Decimal('0'))
+        new_balance = current_balance + debit_amount - credit_amount
+        balances[customer.customer_id] = new_balance
+
+        base = {'customer_id': customer.customer_id, 'shopkeeper_id': shopkeeper.user_id,
+                'transaction_date': now, 'reference_bill_id': bill_id, 'created_date': now}
+        rows = [dict(base,
+                     invoice_no=bill_number,
+                     particulars=f"Bill Purchase - {bill_number}",
+                     debit_amount=debit_amount,
+                     credit_amount=0,
+                     balance_amount=current_balance + debit_amount,
+                     transaction_type='PURCHASE',
+                     notes=f"Products purchased via bill {bill_number}")]
+        if credit_amount > 0:
+            rows.append(dict(base,
+                             invoice_no=f"PAY-{bill_number}",
+                             particulars=f"Payment for Bill {bill_number}",
+                             debit_amount=0,
+                             credit_amount=credit_amount,
+                             balance_amount=new_balance,
+                             transaction_type='PAYMENT',
+                             notes=f"Partial payment for bill {bill_number}"))
+        return rows
+
+    @staticmethod
+    def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+        """Pick 'csv' or 'jsonl' from a file name or content type."""
+        name = (filename or '').lower()
+        if name.endswith('.csv') or (content_type or '').startswith('text/csv'):
+            return 'csv'
+        return 'jsonl'
+
+    @staticmethod
+    def text_stream(raw) -> io.TextIOBase:
+        """Wrap an uploaded binary stream for the csv/json readers."""
+        return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
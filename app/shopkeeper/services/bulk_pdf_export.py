@@ -0,0 +1,148 @@
+"""
+Bulk invoice PDF export as a streamed ZIP.
+Bills already in the PDF cache are copied straight in; the rest have their
+receipt HTML rendered in the request and laid out by WeasyPrint across a
+process pool. Each PDF goes into the archive as soon as it is ready and the
+archive bytes are yielded immediately, so memory holds at most a window of
+in-flight PDFs rather than the whole ZIP.
+"""
+import os
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Tuple
+
+from flask import current_app, render_template
+from werkzeug.utils import secure_filename
+
+from app.extensions import db
+from .pdf_cache import PDFCache
+from .receipt_service import ReceiptService
+from .pdf_renderer import PDFRenderer
+
+# Bills loaded (with items and products) per query
+LOAD_CHUNK_SIZE = 50
+
+
+def _render_pdf(html: str, template_choice: str) -> bytes:
+    """Runs in a pool process."""
+    return PDFRenderer.write_pdf(html, template_choice)
+
+
+class _ZipStream:
+    """Write-only, unseekable file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class BulkPDFExport:
+    """Service class for streaming many invoice PDFs as one ZIP download."""
+
+    _executor = None
+    _pid = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        with cls._lock:
+            if cls._executor is None or cls._pid != os.getpid():
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=int(current_app.config.get('PDF_EXPORT_WORKERS', 2)),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=PDFRenderer.warm
+                )
+                cls._pid = os.getpid()
+            return cls._executor
+
+    @staticmethod
+    def render_html(bill) -> str:
+        """Receipt HTML for a bill loaded by ReceiptService."""
+        return render_template('shopkeeper/bill_receipt.html',
+                               **ReceiptService.build_context(bill), is_editable=False, for_pdf=True)
+
+    @staticmethod
+    def archive_name(bill, used: set) -> str:
+        """Path inside the ZIP: <shop>/<bill number>.pdf, unique within the archive."""
+        folder = secure_filename(bill.shopkeeper.shop_name or '') or f"shop_{bill.shopkeeper_id}"
+        stem = secure_filename(bill.bill_number or '') or f"bill_{bill.bill_id}"
+        name = f"{folder}/{stem}.pdf"
+        if name in used:
+            name = f"{folder}/{stem}_{bill.bill_id}.pdf"
+        used.add(name)
+        return name
+
+    @staticmethod
+    def iter_pdfs(bill_ids: List[int]) -> Iterator[Tuple[object, bytes, str]]:
+        """
+        Yield (bill, pdf, error) in completion order. Cached PDFs come first
+        within each chunk; a failed render yields pdf=None and the error.
+        """
+        executor = BulkPDFExport._get_executor()
+        window = max(1, int(current_app.config.get('PDF_EXPORT_WORKERS', 2)) * 2)
+        pending = {}
+
+        def collect(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                bill = pending.pop(future)
+                try:
+                    pdf = future.result()
+                except Exception as e:
+                    yield bill, None, str(e)
+                    continue
+                if PDFCache.enabled():
+                    PDFCache.store(bill, bill.shopkeeper.template_choice, pdf)
+                yield bill, pdf, None
+
+        try:
+            for start in range(0, len(bill_ids), LOAD_CHUNK_SIZE):
+                for bill in ReceiptService.load_bills(bill_ids[start:start + LOAD_CHUNK_SIZE]):
+                    cached = PDFCache.enabled() and PDFCache.get(bill, bill.shopkeeper.template_choice)
+                    if cached:
+                        with open(cached, 'rb') as f:
+                            yield bill, f.read(), None
+                        continue
+                    pending[executor.submit(_render_pdf, BulkPDFExport.render_html(bill),
+                                            bill.shopkeeper.template_choice)] = bill
+                    while len(pending) >= window:
+                        yield from collect(FIRST_COMPLETED)
+                # Rendered bills keep the attributes they need; drop the rest of the chunk
+                db.session.expunge_all()
+            while pending:
+                yield from collect(FIRST_COMPLETED)
+        finally:
+            # Client went away: don't leave its renders queued ahead of other exports
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def stream_zip(bill_ids: List[int]) -> Iterator[bytes]:
+        """ZIP archive bytes for the given bills, produced incrementally."""
+        sink = _ZipStream()
+        used = set()
+        failures = []
+        # PDFs are already compressed, so entries are stored rather than deflated
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for bill, pdf, error in BulkPDFExport.iter_pdfs(bill_ids):
+                if pdf is None:
+                    failures.append(f"{bill.bill_number} (bill {bill.bill_id}): {error}")
+                    continue
+                archive.writestr(BulkPDFExport.archive_name(bill, used), pdf)
+                yield sink.drain()
+            if failures:
+                archive.writestr('errors.txt', "\n".join(failures) + "\n")
+        yield sink.drain()
@@ -0,0 +1,105 @@
+"""
+CA portfolio queries: GST filing status across a firm's clients and each
+employee's workload. Every figure comes from a grouped query, so a page costs
+the same number of round trips for 5 clients or 500.
+"""
+from typing import Dict, Iterable, List
+
+from sqlalchemy import and_, case, func, select
+
+from app.models import CAConnection, CAEmployee, EmployeeClient, GSTFilingStatus, Shopkeeper
+from app.extensions import db
+
+
+class CAPortfolio:
+    """Service class for CA firm-wide client and employee figures."""
+
+    @staticmethod
+    def connected_shopkeepers(ca_id: int) -> List[Shopkeeper]:
+        """Shopkeepers with an approved connection to the CA."""
+        return db.session.query(Shopkeeper).join(
+            CAConnection, and_(
+                CAConnection.shopkeeper_id == Shopkeeper.shopkeeper_id,
+                CAConnection.ca_id == ca_id,
+                CAConnection.status == 'approved'
+            )
+        ).order_by(Shopkeeper.shopkeeper_id).all()
+
+    @staticmethod
+    def filed_shopkeeper_ids(shopkeeper_ids: Iterable[int], month: str) -> set:
+        """Which of these shopkeepers have a 'Filed' GST status for the month."""
+        shopkeeper_ids = list(shopkeeper_ids)
+        if not shopkeeper_ids:
+            return set()
+        return set(db.session.execute(
+            select(GSTFilingStatus.shopkeeper_id).where(
+                GSTFilingStatus.shopkeeper_id.in_(shopkeeper_ids),
+                GSTFilingStatus.month == month,
+                GSTFilingStatus.status == 'Filed'
+            ).distinct()
+        ).scalars())
+
+    @staticmethod
+    def filing_statuses(shopkeeper_ids: Iterable[int], month: str) -> Dict[int, str]:
+        """'Filed' or 'Not Filed' per shopkeeper for the month."""
+        shopkeeper_ids = list(shopkeeper_ids)
+        filed = CAPortfolio.filed_shopkeeper_ids(shopkeeper_ids, month)
+        return {sid: 'Filed' if sid in filed else 'Not Filed' for sid in shopkeeper_ids}
+
+    @staticmethod
+    def filing_summary(ca_id: int, month: str) -> Dict:
+        """Filed and pending counts over the CA's clients, plus the pending shopkeepers."""
+        shopkeepers = CAPortfolio.connected_shopkeepers(ca_id)
+        filed = CAPortfolio.filed_shopkeeper_ids([s.shopkeeper_id for s in shopkeepers], month)
+        pending = [s for s in shopkeepers if s.shopkeeper_id not in filed]
+        return {
+            'filed_count': len(shopkeepers) - len(pending),
+            'pending_count': len(pending),
+            'pending_clients': pending,
+        }
+
+    @staticmethod
+    def employee_workload(ca_id: int, month: str) -> List[Dict]:
+        """Assigned client count and GST filings made this month, per employee of the CA."""
+        client_counts = select(
+            EmployeeClient.employee_id,
+            func.count(EmployeeClient.id).label('client_count')
+        ).join(CAEmployee, CAEmployee.employee_id == EmployeeClient.employee_id)\
+         .where(CAEmployee.ca_id == ca_id)\
+         .group_by(EmployeeClient.employee_id).subquery()
+        filed_counts = select(
+            GSTFilingStatus.employee_id,
+            func.count(GSTFilingStatus.id).label('gst_filed')
+        ).join(CAEmployee, CAEmployee.employee_id == GSTFilingStatus.employee_id).where(
+            CAEmployee.ca_id == ca_id,
+            GSTFilingStatus.month == month,
+            GSTFilingStatus.status == 'Filed'
+        ).group_by(GSTFilingStatus.employee_id).subquery()
+
+        rows = db.session.execute(
+            select(
+                CAEmployee.employee_id,
+                CAEmployee.name,
+                func.coalesce(client_counts.c.client_count, 0),
+                func.coalesce(filed_counts.c.gst_filed, 0)
+            )
+            .outerjoin(client_counts, client_counts.c.employee_id == CAEmployee.employee_id)
+            .outerjoin(filed_counts, filed_counts.c.employee_id == CAEmployee.employee_id)
+            .where(CAEmployee.ca_id == ca_id)
+            .order_by(CAEmployee.employee_id)
+        )
+        return [
+            {'employee_id': employee_id, 'name': name, 'client_count': int(client_count), 'gst_filed': int(gst_filed)}
+            for employee_id, name, client_count, gst_filed in rows
+        ]
+
+    @staticmethod
+    def connection_counts(ca_id: int) -> Dict[str, int]:
+        """Approved and pending connection counts in one grouped query."""
+        approved, pending = db.session.execute(
+            select(
+                func.coalesce(func.sum(case((CAConnection.status == 'approved', 1), else_=0)), 0),
+                func.coalesce(func.sum(case((CAConnection.status == 'pending', 1), else_=0)), 0)
+            ).where(CAConnection.ca_id == ca_id)
+        ).one()
+        return {'approved': int(approved), 'pending': int(pending)}
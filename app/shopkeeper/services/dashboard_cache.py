@@ -0,0 +1,239 @@
+"""
+Cached shopkeeper dashboard payloads.
+Each section of a shopkeeper's dashboard ('panels': low stock, CA connection,
+employees and recent bills; 'kpis': cards and chart series) is kept for
+DASHBOARD_CACHE_TTL seconds in either a SQLite file shared by every worker on
+the host ('sqlite', the default) or a bounded per-worker LRU ('memory').
+Entries carry the shopkeeper's generation number: a committed write to its
+bills, products or CA links bumps it, so the next load rebuilds on any worker.
+The bump happens only after the commit's daily_sales_rollup refresh, so a
+rebuild never reads (and caches) the rollup as it was before the write.
+The memory backend keeps generations per worker, so only the worker that made
+the write sees the bump; use it only with a single worker. Hosts behind a
+load balancer each keep their own file, so scaled-out deployments should
+disable the cache (empty DASHBOARD_CACHE_BACKEND).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import event, select
+
+from app.models import Bill, BillItem, CAConnection, EmployeeClient, Product
+from app.extensions import db
+from .sales_rollup import SalesRollupService
+
+DASHBOARD_CHANGES_KEY = 'dashboard_shopkeepers'
+# Models whose rows feed the dashboard and carry a shopkeeper_id
+DASHBOARD_MODELS = (Bill, Product, CAConnection, EmployeeClient)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_dashboard_changes(session, flush_context):
+    """Remember which shopkeepers' dashboards this flush changed."""
+    shopkeeper_ids = session.info.setdefault(DASHBOARD_CHANGES_KEY, set())
+    item_bill_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, DASHBOARD_MODELS):
+            shopkeeper_ids.add(obj.shopkeeper_id)
+        elif isinstance(obj, BillItem) and obj.bill_id is not None:
+            item_bill_ids.add(obj.bill_id)
+    if item_bill_ids:
+        shopkeeper_ids.update(session.connection().execute(
+            select(Bill.shopkeeper_id).where(Bill.bill_id.in_(item_bill_ids)).distinct()
+        ).scalars())
+
+
+@event.listens_for(db.session, 'after_commit')
+def _refresh_rollup_and_invalidate_dashboards(session):
+    # One listener so the order is fixed: rollup rows first, then the dashboards built from them
+    refreshed_days = SalesRollupService.refresh_committed(session)
+    shopkeeper_ids = session.info.pop(DASHBOARD_CHANGES_KEY, None) or set()
+    # Also covers earlier failed days retried by this refresh
+    shopkeeper_ids.update(shopkeeper_id for shopkeeper_id, _ in refreshed_days)
+    if shopkeeper_ids:
+        DashboardCache.invalidate(shopkeeper_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_dashboard_changes(session):
+    session.info.pop(DASHBOARD_CHANGES_KEY, None)
+
+
+class MemoryDashboardStore:
+    """Per-worker LRU of (generation, expires_at, payload) by (shopkeeper, section)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, shopkeeper_id: int, section: str) -> Tuple[int, Optional[Dict]]:
+        """Current generation and the payload cached for it (None when missing or expired)."""
+        key = (shopkeeper_id, section)
+        with self._lock:
+            generation = self._generations.get(shopkeeper_id, 0)
+            entry = self._entries.get(key)
+            if entry is None:
+                return generation, None
+            entry_generation, expires_at, payload = entry
+            if entry_generation != generation or expires_at <= time.time():
+                del self._entries[key]
+                return generation, None
+            self._entries.move_to_end(key)
+            return generation, payload
+
+    def put(self, shopkeeper_id: int, section: str, generation: int, payload: Dict, ttl: float):
+        """Store a payload unless the shopkeeper was invalidated since it was built."""
+        key = (shopkeeper_id, section)
+        with self._lock:
+            if self._generations.get(shopkeeper_id, 0) != generation:
+                return
+            self._entries[key] = (generation, time.time() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, shopkeeper_ids: Iterable[int]):
+        # Entries of an older generation are dropped when next read (or by LRU)
+        with self._lock:
+            for shopkeeper_id in shopkeeper_ids:
+                self._generations[shopkeeper_id] = self._generations.get(shopkeeper_id, 0) + 1
+
+
+class SQLiteDashboardStore:
+    """Payloads in a local SQLite file, so every worker shares entries and invalidations."""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS dashboard_generations ("
+        " shopkeeper_id INTEGER PRIMARY KEY,"
+        " generation INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS dashboard_entries ("
+        " shopkeeper_id INTEGER NOT NULL,"
+        " section TEXT NOT NULL,"
+        " generation INTEGER NOT NULL,"
+        " expires_at REAL NOT NULL,"
+        " payload BLOB NOT NULL,"
+        " PRIMARY KEY (shopkeeper_id, section))",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, shopkeeper_id: int, section: str) -> Tuple[int, Optional[Dict]]:
+        with self._connect() as conn:
+            generation, entry_generation, expires_at, payload = conn.execute(
+                "SELECT COALESCE(g.generation, 0), e.generation, e.expires_at, e.payload"
+                " FROM (SELECT ? AS shopkeeper_id, ? AS section) k"
+                " LEFT JOIN dashboard_generations g ON g.shopkeeper_id = k.shopkeeper_id"
+                " LEFT JOIN dashboard_entries e ON e.shopkeeper_id = k.shopkeeper_id AND e.section = k.section",
+                (shopkeeper_id, section)
+            ).fetchone()
+        if payload is None or entry_generation != generation or expires_at <= time.time():
+            return generation, None
+        return generation, pickle.loads(payload)
+
+    def put(self, shopkeeper_id: int, section: str, generation: int, payload: Dict, ttl: float):
+        # The WHERE clause drops the write if another worker invalidated meanwhile
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO dashboard_entries (shopkeeper_id, section, generation, expires_at, payload)"
+                " SELECT ?, ?, ?, ?, ?"
+                " WHERE COALESCE((SELECT generation FROM dashboard_generations WHERE shopkeeper_id = ?), 0) = ?"
+                " ON CONFLICT (shopkeeper_id, section) DO UPDATE SET generation = excluded.generation,"
+                " expires_at = excluded.expires_at, payload = excluded.payload",
+                (shopkeeper_id, section, generation, time.time() + ttl,
+                 pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), shopkeeper_id, generation)
+            )
+
+    def invalidate(self, shopkeeper_ids: Iterable[int]):
+        params = [(shopkeeper_id,) for shopkeeper_id in shopkeeper_ids]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO dashboard_generations (shopkeeper_id, generation) VALUES (?, 1)"
+                " ON CONFLICT (shopkeeper_id) DO UPDATE SET generation = dashboard_generations.generation + 1",
+                params
+            )
+            conn.executemany("DELETE FROM dashboard_entries WHERE shopkeeper_id = ?", params)
+
+
+class DashboardCache:
+    """Service class for the shopkeeper dashboard payload cache."""
+
+    _store = None
+    _store_config = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def store():
+        """The configured backend for this worker, or None when caching is off."""
+        config = current_app.config
+        backend = (config.get('DASHBOARD_CACHE_BACKEND') or '').lower()
+        settings = (backend, config.get('DASHBOARD_CACHE_SIZE', 512), config.get('DASHBOARD_CACHE_PATH'))
+        if DashboardCache._store_config != settings:
+            with DashboardCache._lock:
+                if DashboardCache._store_config != settings:
+                    if backend == 'memory':
+                        DashboardCache._store = MemoryDashboardStore(int(settings[1]))
+                    elif backend == 'sqlite':
+                        DashboardCache._store = SQLiteDashboardStore(
+                            settings[2] or os.path.join(os.getcwd(), 'dashboard_cache', 'dashboard.sqlite3'))
+                    else:
+                        DashboardCache._store = None
+                    DashboardCache._store_config = settings
+        return DashboardCache._store
+
+    @staticmethod
+    def get_or_build(shopkeeper_id: int, section: str, build: Callable[[], Dict]) -> Dict:
+        """Cached payload of one dashboard section for a shopkeeper, calling build() on a miss."""
+        store = DashboardCache.store()
+        if store is None:
+            return build()
+        try:
+            generation, payload = store.get(shopkeeper_id, section)
+        except sqlite3.Error:
+            current_app.logger.warning("Dashboard cache unavailable", exc_info=True)
+            return build()
+        if payload is not None:
+            return payload
+
+        payload = build()
+        try:
+            store.put(shopkeeper_id, section, generation, payload, float(current_app.config.get('DASHBOARD_CACHE_TTL', 60)))
+        except sqlite3.Error:
+            current_app.logger.warning("Dashboard cache unavailable", exc_info=True)
+        return payload
+
+    @staticmethod
+    def mark_changed(shopkeeper_ids: Iterable[int]):
+        """Queue shopkeepers changed outside the ORM (Core statements) for invalidation on commit."""
+        db.session.info.setdefault(DASHBOARD_CHANGES_KEY, set()).update(shopkeeper_ids)
+
+    @staticmethod
+    def invalidate(shopkeeper_ids: Iterable[int]):
+        """Drop the cached dashboards of these shopkeepers now."""
+        shopkeeper_ids = [sid for sid in shopkeeper_ids if sid is not None]
+        store = DashboardCache.store()
+        if store is None or not shopkeeper_ids:
+            return
+        try:
+            store.invalidate(shopkeeper_ids)
+        except sqlite3.Error:
+            current_app.logger.warning("Dashboard cache invalidation failed", exc_info=True)
@@ -0,0 +1,125 @@
+"""
+Shopkeeper dashboard aggregates and payload.
+This month's and last month's KPIs and the six-month sales series come from
+one conditional-SUM query over daily_sales_rollup (at most ~186 rows); only
+today's payment-status counts read bills, and only today's. Neither cost
+grows with a shop's bill history. kpis() and panels() return plain values so
+each can be cached on its own (see dashboard_cache).
+"""
+import datetime
+from typing import Dict, List, Tuple
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, case, func, select
+
+from app.models import (Bill, CAConnection, CAEmployee, CharteredAccountant, DailySalesRollup,
+                        EmployeeClient, Product)
+from app.extensions import db
+
+CHART_MONTHS = 6
+
+
+class DashboardService:
+    """Service class for shopkeeper dashboard KPIs."""
+
+    @staticmethod
+    def chart_months(today: datetime.date) -> List[Tuple[datetime.date, datetime.date]]:
+        """(first day, last day) of each chart month, oldest first, ending with today's month."""
+        months = []
+        for i in range(CHART_MONTHS - 1, -1, -1):
+            start = (today - relativedelta(months=i)).replace(day=1)
+            months.append((start, start + relativedelta(months=1) - datetime.timedelta(days=1)))
+        return months
+
+    @staticmethod
+    def kpis(shopkeeper_id: int, today: datetime.date = None) -> Dict:
+        """All bill-based dashboard figures for a shopkeeper."""
+        today = today or datetime.date.today()
+        months = DashboardService.chart_months(today)
+        month_start = months[-1][0]
+        last_month_start, last_month_end = months[-2]
+        day = DailySalesRollup.sales_date
+
+        def sum_when(column, *conditions):
+            return func.coalesce(func.sum(case((and_(*conditions), column), else_=0)), 0)
+
+        columns = [
+            sum_when(DailySalesRollup.gross_total, day == today).label('today_total'),
+            sum_when(DailySalesRollup.gross_total, day >= month_start, day <= today).label('month_total'),
+            sum_when(DailySalesRollup.bill_count, day >= month_start, day <= today).label('month_count'),
+            sum_when(DailySalesRollup.gross_total, day >= last_month_start, day <= last_month_end).label('last_month_total'),
+        ] + [
+            sum_when(DailySalesRollup.gross_total, day >= start, day <= end).label(f'chart_{i}')
+            for i, (start, end) in enumerate(months)
+        ]
+        row = db.session.execute(
+            select(*columns).where(
+                DailySalesRollup.shopkeeper_id == shopkeeper_id,
+                day >= months[0][0],
+                day <= months[-1][1]
+            )
+        ).one()
+
+        # Payment-status counts aren't rolled up; count today's bills directly
+        status = func.upper(Bill.payment_status)
+        paid, unpaid, partial = db.session.execute(
+            select(*[func.coalesce(func.sum(case((status == value, 1), else_=0)), 0)
+                     for value in ('PAID', 'UNPAID', 'PARTIAL')])
+            .where(Bill.shopkeeper_id == shopkeeper_id, Bill.bill_date == today)
+        ).one()
+
+        monthly_total = float(row.month_total)
+        last_month_total = float(row.last_month_total)
+        monthly_growth = 0
+        if last_month_total > 0:
+            monthly_growth = ((monthly_total - last_month_total) / last_month_total) * 100
+
+        return {
+            'total_amount': float(row.today_total),
+            'paid': int(paid),
+            'unpaid': int(unpaid),
+            'partial': int(partial),
+            'monthly_total': monthly_total,
+            'monthly_bills_count': int(row.month_count),
+            'monthly_growth': round(monthly_growth, 1),
+            'monthly_sales_labels': [start.strftime('%b %Y') for start, _ in months],
+            'monthly_sales_data': [float(getattr(row, f'chart_{i}')) for i in range(len(months))],
+        }
+
+    @staticmethod
+    def panels(shopkeeper_id: int) -> Dict:
+        """Low stock, CA connection, employees and recent bills, as plain dicts."""
+        payload = {}
+
+        low_stock = Product.query.filter_by(shopkeeper_id=shopkeeper_id)\
+            .filter(Product.stock_qty <= Product.low_stock_threshold).all()
+        payload['low_stock'] = [
+            {'product_id': p.product_id, 'product_name': p.product_name, 'stock_qty': p.stock_qty}
+            for p in low_stock
+        ]
+
+        # CA connection and employees
+        payload['connected_ca'] = None
+        payload['connected_employees'] = []
+        ca_conn = CAConnection.query.filter_by(shopkeeper_id=shopkeeper_id, status='approved').first()
+        if ca_conn:
+            connected_ca = db.session.get(CharteredAccountant, ca_conn.ca_id)
+            if connected_ca:
+                payload['connected_ca'] = {'ca_id': connected_ca.ca_id, 'firm_name': connected_ca.firm_name}
+                employees = db.session.query(CAEmployee)\
+                    .join(EmployeeClient, CAEmployee.employee_id == EmployeeClient.employee_id)\
+                    .filter(EmployeeClient.shopkeeper_id == shopkeeper_id)\
+                    .all()
+                payload['connected_employees'] = [
+                    {'employee_id': e.employee_id, 'name': e.name, 'email': e.email} for e in employees
+                ]
+
+        recent_bills = Bill.query.filter_by(shopkeeper_id=shopkeeper_id)\
+            .order_by(Bill.bill_date.desc()).limit(5).all()
+        payload['recent_bills'] = [
+            {'bill_id': b.bill_id, 'bill_number': b.bill_number, 'bill_date': b.bill_date,
+             'customer_name': b.customer_name, 'payment_status': b.payment_status,
+             'total_amount': b.total_amount}
+            for b in recent_bills
+        ]
+        return payload
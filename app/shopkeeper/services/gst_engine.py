@@ -0,0 +1,207 @@
+"""
+GST computation engine shared by receipts, PDFs, bill creation and reports.
+Computes a whole batch of bill lines at once (taxable value, CGST/SGST 50/50
+split, line totals) and the per-rate summary shown on invoices.
+
+Modes:
+    'float'   - NumPy float64, same arithmetic as the original receipt loops
+    'paise'   - NumPy int64 paise with half-up rounding per line (exact sums)
+    'decimal' - Python Decimal quantized to 0.01 with ROUND_HALF_UP (exact)
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+MODES = ('float', 'paise', 'decimal')
+AMOUNT_COLUMNS = ('total_base_price', 'discount_amount', 'discounted_price',
+                  'cgst_amount', 'sgst_amount', 'total_gst_amount', 'final_price')
+PAISE_PER_RUPEE = 100
+RATE_SCALE = 10000  # GST rates are carried as basis points in paise mode (0.25% -> 25)
+CENT = Decimal('0.01')
+
+
+def rate_key(gst_rate) -> str:
+    """Label used for a GST rate in per-rate summaries ('18', '0.25', '0')."""
+    return f"{float(gst_rate or 0):g}"
+
+
+def _round_half_up_div(numerator: np.ndarray, denominator: int) -> np.ndarray:
+    """Integer division rounding halves away from zero."""
+    sign = np.sign(numerator)
+    return sign * ((2 * np.abs(numerator) + denominator) // (2 * denominator))
+
+
+class GSTEngine:
+    """Batch GST calculations for bill lines."""
+
+    @staticmethod
+    def compute_batch(quantity: Sequence, price: Sequence, discount: Sequence = None,
+                      gst_rate: Sequence = None, mode: str = 'float') -> Dict:
+        """
+        Compute every amount column for a batch of lines in one call.
+        discount and gst_rate are percentages. Returns a dict of columns: NumPy
+        float64 arrays (rupees) in 'float' mode, int64 arrays (paise) in 'paise'
+        mode and lists of Decimal (rupees) in 'decimal' mode. 'cgst_rate' and
+        'sgst_rate' are always float percentages.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown GST mode: {mode}")
+        count = len(quantity)
+        if discount is None:
+            discount = [0] * count
+        if gst_rate is None:
+            gst_rate = [0] * count
+
+        if mode == 'decimal':
+            return GSTEngine._compute_decimal(quantity, price, discount, gst_rate)
+
+        qty = np.asarray(quantity, dtype=np.float64)
+        rates = np.asarray(gst_rate, dtype=np.float64)
+        half_rates = rates / 2.0
+
+        if mode == 'float':
+            unit_price = np.asarray(price, dtype=np.float64)
+            total_base_price = unit_price * qty
+            discount_amount = total_base_price * (np.asarray(discount, dtype=np.float64) / 100.0)
+            discounted_price = total_base_price - discount_amount
+            cgst_amount = discounted_price * (half_rates / 100.0)
+            sgst_amount = discounted_price * (half_rates / 100.0)
+        else:
+            price_paise = np.rint(np.asarray(price, dtype=np.float64) * PAISE_PER_RUPEE).astype(np.int64)
+            discount_bp = np.rint(np.asarray(discount, dtype=np.float64) * 100).astype(np.int64)
+            rate_bp = np.rint(rates * 100).astype(np.int64)
+            total_base_price = np.rint(price_paise * qty).astype(np.int64)
+            discount_amount = _round_half_up_div(total_base_price * discount_bp, RATE_SCALE)
+            discounted_price = total_base_price - discount_amount
+            # Each half is rounded on its own, as printed on the invoice
+            cgst_amount = _round_half_up_div(discounted_price * rate_bp, 2 * RATE_SCALE)
+            sgst_amount = cgst_amount.copy()
+
+        total_gst_amount = cgst_amount + sgst_amount
+        return {
+            'gst_rate': rates,
+            'cgst_rate': half_rates,
+            'sgst_rate': half_rates,
+            'total_base_price': total_base_price,
+            'discount_amount': discount_amount,
+            'discounted_price': discounted_price,
+            'cgst_amount': cgst_amount,
+            'sgst_amount': sgst_amount,
+            'total_gst_amount': total_gst_amount,
+            'final_price': discounted_price + total_gst_amount,
+        }
+
+    @staticmethod
+    def _compute_decimal(quantity, price, discount, gst_rate) -> Dict:
+        """Decimal-exact columns, rounded per line to the paisa."""
+        columns = {name: [] for name in AMOUNT_COLUMNS}
+        rates, half_rates = [], []
+        for qty, unit_price, disc, rate in zip(quantity, price, discount, gst_rate):
+            rate = Decimal(str(rate or 0))
+            half_rate = rate / 2
+            total_base_price = (Decimal(str(unit_price)) * Decimal(str(qty))).quantize(CENT, rounding=ROUND_HALF_UP)
+            discount_amount = (total_base_price * Decimal(str(disc or 0)) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+            discounted_price = total_base_price - discount_amount
+            cgst_amount = (discounted_price * half_rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+            sgst_amount = cgst_amount
+            columns['total_base_price'].append(total_base_price)
+            columns['discount_amount'].append(discount_amount)
+            columns['discounted_price'].append(discounted_price)
+            columns['cgst_amount'].append(cgst_amount)
+            columns['sgst_amount'].append(sgst_amount)
+            columns['total_gst_amount'].append(cgst_amount + sgst_amount)
+            columns['final_price'].append(discounted_price + cgst_amount + sgst_amount)
+            rates.append(float(rate))
+            half_rates.append(float(half_rate))
+        columns['gst_rate'] = rates
+        columns['cgst_rate'] = half_rates
+        columns['sgst_rate'] = half_rates
+        return columns
+
+    @staticmethod
+    def to_rupees(values, mode: str) -> List:
+        """Convert a computed column to plain Python rupee values for templates and JSON."""
+        if mode == 'decimal':
+            return list(values)
+        if mode == 'paise':
+            return [Decimal(int(v)) / PAISE_PER_RUPEE for v in values]
+        return np.asarray(values, dtype=np.float64).tolist()
+
+    @staticmethod
+    def summarize_by_rate(columns: Dict, mode: str = 'float') -> Dict[str, Dict]:
+        """Per-rate taxable value and CGST/SGST totals, keyed by rate_key()."""
+        fields = (('taxable_amount', 'discounted_price'), ('cgst_amount', 'cgst_amount'),
+                  ('sgst_amount', 'sgst_amount'), ('total_gst_amount', 'total_gst_amount'))
+        rates = np.asarray(columns['gst_rate'], dtype=np.float64)
+        if rates.size == 0:
+            return {}
+
+        # Rates in first-seen order so the summary follows the bill's line order
+        unique_rates, first_index, inverse = np.unique(rates, return_index=True, return_inverse=True)
+        order = np.argsort(first_index)
+
+        summary = {}
+        if mode == 'decimal':
+            for position in order:
+                summary[rate_key(unique_rates[position])] = {name: Decimal('0') for name, _ in fields}
+            for idx, rate in enumerate(rates):
+                bucket = summary[rate_key(rate)]
+                for name, column in fields:
+                    bucket[name] += columns[column][idx]
+            return summary
+
+        sums = {name: np.bincount(inverse, weights=np.asarray(columns[column], dtype=np.float64),
+                                  minlength=len(unique_rates))
+                for name, column in fields}
+        for position in order:
+            bucket = {}
+            for name, _ in fields:
+                value = sums[name][position]
+                bucket[name] = (Decimal(int(round(value))) / PAISE_PER_RUPEE
+                                if mode == 'paise' else float(value))
+            summary[rate_key(unique_rates[position])] = bucket
+        return summary
+
+    @staticmethod
+    def receipt_summary(lines: List[Dict], mode: str = 'float') -> Dict:
+        """
+        Compute receipt data for bill lines.
+        Each line carries 'quantity', 'price', 'discount' and 'gst_rate' plus any
+        display fields (product, hsn_code, is_custom), which are passed through.
+        Returns the per-line dicts and totals used by bill_receipt.html.
+        """
+        columns = GSTEngine.compute_batch(
+            [line['quantity'] for line in lines],
+            [line['price'] for line in lines],
+            [line.get('discount', 0) for line in lines],
+            [line.get('gst_rate', 0) for line in lines],
+            mode=mode
+        )
+        rupees = {name: GSTEngine.to_rupees(columns[name], mode) for name in AMOUNT_COLUMNS}
+        cgst_rates = np.asarray(columns['cgst_rate'], dtype=np.float64).tolist()
+
+        computed_lines = []
+        for idx, line in enumerate(lines):
+            item = dict(line)
+            item.update({
+                'base_price': line['price'],
+                'gst_rate': float(line.get('gst_rate', 0) or 0),
+                'cgst_rate': cgst_rates[idx],
+                'sgst_rate': cgst_rates[idx],
+            })
+            for name in AMOUNT_COLUMNS:
+                item[name] = rupees[name][idx]
+            computed_lines.append(item)
+
+        gst_summary_by_rate = GSTEngine.summarize_by_rate(columns, mode)
+        zero = Decimal('0') if mode != 'float' else 0.0
+        return {
+            'lines': computed_lines,
+            'gst_summary_by_rate': gst_summary_by_rate,
+            'overall_grand_total': sum(rupees['final_price'], zero),
+            'total_taxable_amount': sum((s['taxable_amount'] for s in gst_summary_by_rate.values()), zero),
+            'total_cgst_amount': sum((s['cgst_amount'] for s in gst_summary_by_rate.values()), zero),
+            'total_sgst_amount': sum((s['sgst_amount'] for s in gst_summary_by_rate.values()), zero),
+            'total_gst_amount': sum((s['total_gst_amount'] for s in gst_summary_by_rate.values()), zero),
+        }
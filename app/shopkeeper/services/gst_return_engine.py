@@ -0,0 +1,211 @@
+"""
+GST return (GSTR-1 / GSTR-3B) summary for one shopkeeper-month.
+Figures come from three grouped queries over the month's bills and their
+items' GST snapshot columns: invoices per customer GSTIN, tax per
+(GSTIN, rate) and tax per (HSN, rate). Bills with a customer GSTIN are B2B,
+the rest B2C. Items written before snapshots existed are fetched in one
+extra query and computed with GSTEngine the way receipts show them.
+Once the month is marked Filed the summary is stored in gst_return_snapshots
+and served from there, so a filed month is never recomputed.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, literal_column, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Bill, BillItem, GSTFilingStatus, GSTReturnSnapshot, Product
+from app.extensions import db
+from .gst_engine import CENT, GSTEngine, rate_key
+from .monthly_statement import MonthlyStatement
+
+TAX_FIELDS = ('taxable_value', 'cgst_amount', 'sgst_amount')
+
+
+def _rupees(value) -> float:
+    return float(Decimal(str(value or 0)).quantize(CENT))
+
+
+def _tax_row(amounts: Dict[str, Decimal]) -> Dict:
+    row = {name: _rupees(amounts[name]) for name in TAX_FIELDS}
+    row['total_tax'] = _rupees(amounts['cgst_amount'] + amounts['sgst_amount'])
+    return row
+
+
+class GSTReturnEngine:
+    """Service class for monthly GST return summaries."""
+
+    @staticmethod
+    def customer_gstin():
+        """Bill.customer_gstin with blanks as NULL (NULL means a B2C bill)."""
+        # literal_column keeps '' out of the bind parameters so GROUP BY matches the select list on MSSQL
+        return func.nullif(func.trim(Bill.customer_gstin), literal_column("''"))
+
+    @staticmethod
+    def compute(shopkeeper_id: int, month: str) -> Dict:
+        """Rate-wise, HSN-wise and B2B/B2C totals for a 'YYYY-MM' month, as plain JSON-ready values."""
+        start, end = MonthlyStatement.month_range(month)
+        in_month = and_(Bill.shopkeeper_id == shopkeeper_id, Bill.bill_date >= start, Bill.bill_date < end)
+        gstin = GSTReturnEngine.customer_gstin().label('customer_gstin')
+
+        def zero_amounts():
+            return {name: Decimal('0') for name in TAX_FIELDS}
+
+        invoices = db.session.execute(
+            select(gstin, func.count(Bill.bill_id).label('invoice_count'),
+                   func.coalesce(func.sum(Bill.total_amount), 0).label('invoice_value'))
+            .where(in_month).group_by(gstin)
+        ).all()
+
+        # (gstin, rate) and (hsn, rate) buckets; snapshotted items are summed in the database
+        by_gstin_rate = defaultdict(zero_amounts)
+        by_hsn_rate = defaultdict(lambda: dict(zero_amounts(), quantity=0))
+        sums = [func.coalesce(func.sum(getattr(BillItem, name)), 0).label(name) for name in TAX_FIELDS]
+        for row in db.session.execute(
+            select(gstin, BillItem.gst_rate, *sums)
+            .select_from(Bill).join(BillItem, BillItem.bill_id == Bill.bill_id)
+            .where(in_month, BillItem.gst_rate.isnot(None))
+            .group_by(gstin, BillItem.gst_rate)
+        ):
+            bucket = by_gstin_rate[(row.customer_gstin, rate_key(row.gst_rate))]
+            for name in TAX_FIELDS:
+                bucket[name] += Decimal(str(row._mapping[name]))
+        for row in db.session.execute(
+            select(BillItem.hsn_code, BillItem.gst_rate,
+                   func.coalesce(func.sum(BillItem.quantity), 0).label('quantity'), *sums)
+            .select_from(Bill).join(BillItem, BillItem.bill_id == Bill.bill_id)
+            .where(in_month, BillItem.gst_rate.isnot(None))
+            .group_by(BillItem.hsn_code, BillItem.gst_rate)
+        ):
+            bucket = by_hsn_rate[(row.hsn_code or '', rate_key(row.gst_rate))]
+            bucket['quantity'] += int(row.quantity)
+            for name in TAX_FIELDS:
+                bucket[name] += Decimal(str(row._mapping[name]))
+
+        # Items not yet backfilled: catalog rate/HSN and no discount, as on their receipts
+        legacy = db.session.execute(
+            select(gstin, BillItem.product_id, BillItem.quantity, BillItem.price_per_unit,
+                   BillItem.custom_gst_rate, BillItem.custom_hsn_code,
+                   Product.gst_rate.label('product_gst_rate'), Product.hsn_code.label('product_hsn_code'))
+            .select_from(Bill).join(BillItem, BillItem.bill_id == Bill.bill_id)
+            .outerjoin(Product, Product.product_id == BillItem.product_id)
+            .where(in_month, BillItem.gst_rate.is_(None))
+        ).all()
+        if legacy:
+            custom = [row.product_id is None for row in legacy]
+            rates = [float((row.custom_gst_rate if is_custom else row.product_gst_rate) or 0)
+                     for row, is_custom in zip(legacy, custom)]
+            columns = GSTEngine.compute_batch([row.quantity for row in legacy],
+                                              [row.price_per_unit for row in legacy],
+                                              None, rates, mode='decimal')
+            for idx, row in enumerate(legacy):
+                amounts = {'taxable_value': columns['discounted_price'][idx],
+                           'cgst_amount': columns['cgst_amount'][idx],
+                           'sgst_amount': columns['sgst_amount'][idx]}
+                hsn_code = (row.custom_hsn_code if custom[idx] else row.product_hsn_code) or ''
+                hsn_bucket = by_hsn_rate[(hsn_code, rate_key(rates[idx]))]
+                hsn_bucket['quantity'] += int(row.quantity)
+                for bucket in (by_gstin_rate[(row.customer_gstin, rate_key(rates[idx]))], hsn_bucket):
+                    for name in TAX_FIELDS:
+                        bucket[name] += amounts[name]
+
+        by_rate = defaultdict(zero_amounts)
+        b2c_by_rate = defaultdict(zero_amounts)
+        b2b_by_gstin = defaultdict(dict)
+        for (customer_gstin, rate), amounts in by_gstin_rate.items():
+            for name in TAX_FIELDS:
+                by_rate[rate][name] += amounts[name]
+            if customer_gstin is None:
+                for name in TAX_FIELDS:
+                    b2c_by_rate[rate][name] += amounts[name]
+            else:
+                b2b_by_gstin[customer_gstin][rate] = amounts
+
+        def rate_rows(buckets):
+            return [dict(_tax_row(buckets[rate]), gst_rate=rate) for rate in sorted(buckets, key=float)]
+
+        b2b = []
+        b2c = {'invoice_count': 0, 'invoice_value': 0.0, 'rates': rate_rows(b2c_by_rate)}
+        for row in sorted(invoices, key=lambda r: r.customer_gstin or ''):
+            if row.customer_gstin is None:
+                b2c.update(invoice_count=int(row.invoice_count), invoice_value=_rupees(row.invoice_value))
+            else:
+                b2b.append({'customer_gstin': row.customer_gstin, 'invoice_count': int(row.invoice_count),
+                            'invoice_value': _rupees(row.invoice_value),
+                            'rates': rate_rows(b2b_by_gstin.get(row.customer_gstin, {}))})
+
+        totals = zero_amounts()
+        for amounts in by_rate.values():
+            for name in TAX_FIELDS:
+                totals[name] += amounts[name]
+        gstr3b = _tax_row(totals)
+        gstr3b.update({
+            'nil_rated_value': _rupees(by_rate['0']['taxable_value']) if '0' in by_rate else 0.0,
+            'invoice_count': sum(int(row.invoice_count) for row in invoices),
+            'invoice_value': _rupees(sum(Decimal(str(row.invoice_value)) for row in invoices)),
+        })
+
+        return {
+            'month': month,
+            'computed_at': datetime.now().isoformat(timespec='seconds'),
+            'rate_wise': rate_rows(by_rate),
+            'hsn_wise': [
+                dict(_tax_row(by_hsn_rate[key]), hsn_code=key[0], gst_rate=key[1],
+                     quantity=by_hsn_rate[key]['quantity'])
+                for key in sorted(by_hsn_rate, key=lambda k: (k[0], float(k[1])))
+            ],
+            'b2b': b2b,
+            'b2c': b2c,
+            'gstr3b': gstr3b,
+        }
+
+    @staticmethod
+    def snapshot_row(shopkeeper_id: int, month: str) -> Optional[GSTReturnSnapshot]:
+        return GSTReturnSnapshot.query.filter_by(shopkeeper_id=shopkeeper_id, month=month).first()
+
+    @staticmethod
+    def snapshot(shopkeeper_id: int, month: str) -> Dict:
+        """
+        Store the month's summary as its snapshot (caller commits) and return it.
+        An existing snapshot is never replaced: it is returned as stored. A
+        concurrent first snapshot fails the commit on
+        UQ_gst_return_snapshots_shopkeeper_month.
+        """
+        row = GSTReturnEngine.snapshot_row(shopkeeper_id, month)
+        if row is not None:
+            return json.loads(row.summary)
+        summary = GSTReturnEngine.compute(shopkeeper_id, month)
+        db.session.add(GSTReturnSnapshot(shopkeeper_id=shopkeeper_id, month=month, summary=json.dumps(summary)))
+        return summary
+
+    @staticmethod
+    def stored(shopkeeper_id: int, month: str) -> Optional[Dict]:
+        """The snapshot of a Filed month, taking it now if the month was filed before snapshots existed; else None."""
+        filed = db.session.execute(
+            select(GSTFilingStatus.id, GSTReturnSnapshot.summary)
+            .outerjoin(GSTReturnSnapshot, and_(GSTReturnSnapshot.shopkeeper_id == GSTFilingStatus.shopkeeper_id,
+                                               GSTReturnSnapshot.month == GSTFilingStatus.month))
+            .where(GSTFilingStatus.shopkeeper_id == shopkeeper_id, GSTFilingStatus.month == month,
+                   GSTFilingStatus.status == 'Filed')
+            .limit(1)
+        ).first()
+        if filed is None:
+            return None
+        if filed.summary is not None:
+            return json.loads(filed.summary)
+        summary = GSTReturnEngine.snapshot(shopkeeper_id, month)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request stored the snapshot first; serve that one
+            db.session.rollback()
+            return json.loads(GSTReturnEngine.snapshot_row(shopkeeper_id, month).summary)
+        return summary
+
+    @staticmethod
+    def summary(shopkeeper_id: int, month: str) -> Dict:
+        """GST return summary for the month: the stored snapshot once Filed, computed otherwise."""
+        return GSTReturnEngine.stored(shopkeeper_id, month) or GSTReturnEngine.compute(shopkeeper_id, month)
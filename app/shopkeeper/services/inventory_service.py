@@ -0,0 +1,97 @@
+"""
+Inventory and stock service.
+Stock changes are applied in the database (stock_qty = stock_qty - :n) so
+concurrent billing terminals never overwrite each other's decrements.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, or_, update
+
+from app.models import Product
+from app.extensions import db
+from .dashboard_cache import DashboardCache
+
+
+class InventoryService:
+    """Service class for product lookup and atomic stock updates."""
+
+    @staticmethod
+    def get_products(shopkeeper_id: int, product_ids: Iterable) -> Dict[str, Product]:
+        """Fetch every product referenced by a bill with one IN query, keyed by id string."""
+        ids = {int(pid) for pid in product_ids if str(pid).strip().isdigit()}
+        if not ids:
+            return {}
+        products = Product.query.filter(
+            Product.shopkeeper_id == shopkeeper_id,
+            Product.product_id.in_(ids)
+        ).all()
+        return {str(p.product_id): p for p in products}
+
+    @staticmethod
+    def adjust_stock(shopkeeper_id: int, deltas: Dict[int, int],
+                     reject_if_insufficient: bool = False) -> Tuple[bool, List[Dict]]:
+        """
+        Take quantities out of stock in a single conditional UPDATE.
+        Positive deltas decrement stock, negative deltas put stock back.
+        With reject_if_insufficient, no row is changed unless every decrement fits
+        the current stock. Returns (success_flag, failed_items).
+        """
+        deltas = {int(pid): int(qty) for pid, qty in deltas.items() if int(qty) != 0}
+        if not deltas:
+            return True, []
+
+        amount = case(deltas, value=Product.product_id, else_=0)
+        stmt = update(Product).where(
+            Product.shopkeeper_id == shopkeeper_id,
+            Product.product_id.in_(list(deltas))
+        )
+        if reject_if_insufficient:
+            stmt = stmt.where(or_(amount <= 0, Product.stock_qty >= amount))
+        stmt = stmt.values(stock_qty=Product.stock_qty - amount)\
+                   .execution_options(synchronize_session=False)
+
+        savepoint = db.session.begin_nested() if reject_if_insufficient else None
+        result = db.session.execute(stmt)
+        if result.rowcount == len(deltas):
+            if savepoint is not None:
+                savepoint.commit()
+            # Core UPDATE: the dashboard's low-stock list isn't seen by the flush listener
+            DashboardCache.mark_changed([shopkeeper_id])
+            return True, []
+
+        if savepoint is not None:
+            savepoint.rollback()
+        return False, InventoryService._find_failed_items(shopkeeper_id, deltas, reject_if_insufficient)
+
+    @staticmethod
+    def decrement_stock(shopkeeper_id: int, quantities: Dict[int, int],
+                        reject_if_insufficient: bool = False) -> Tuple[bool, List[Dict]]:
+        """Decrement stock for sold quantities. Returns (success_flag, failed_items)."""
+        return InventoryService.adjust_stock(shopkeeper_id, quantities, reject_if_insufficient)
+
+    @staticmethod
+    def restock(shopkeeper_id: int, quantities: Dict[int, int]) -> Tuple[bool, List[Dict]]:
+        """Put quantities back into stock (returns, deleted bill lines)."""
+        return InventoryService.adjust_stock(
+            shopkeeper_id, {pid: -int(qty) for pid, qty in quantities.items()}
+        )
+
+    @staticmethod
+    def _find_failed_items(shopkeeper_id: int, deltas: Dict[int, int],
+                           check_stock: bool) -> List[Dict]:
+        """Work out which items the conditional update skipped."""
+        available = dict(
+            db.session.query(Product.product_id, Product.stock_qty).filter(
+                Product.shopkeeper_id == shopkeeper_id,
+                Product.product_id.in_(list(deltas))
+            ).all()
+        )
+        failed = []
+        for product_id, qty in deltas.items():
+            if product_id not in available:
+                failed.append({'product_id': product_id, 'requested': qty,
+                               'available': None, 'reason': 'not_found'})
+            elif check_stock and qty > 0 and (available[product_id] or 0) < qty:
+                failed.append({'product_id': product_id, 'requested': qty,
+                               'available': available[product_id], 'reason': 'insufficient_stock'})
+        return failed
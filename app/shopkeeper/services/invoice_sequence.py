@@ -0,0 +1,134 @@
+"""
+Invoice number allocation service.
+Each worker reserves a block of numbers per shopkeeper from the
+invoice_sequences table (hi/lo) and hands them out locally, so bill creation
+never updates the shopkeepers row and parallel bills cannot share a number.
+Unused numbers in a block are skipped when a worker restarts (gap-tolerant).
+A reset bumps the row's reset_epoch; every worker compares its block's epoch
+with the row's before issuing a number, so no worker keeps numbering from a
+block reserved before the reset.
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import InvoiceSequence
+from app.extensions import db
+
+# Attempts to reserve a block when seeding the counter row races another worker
+RESERVE_ATTEMPTS = 3
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from per-worker blocks of a shared counter."""
+
+    def __init__(self, block_size: Optional[int] = None):
+        self._block_size = block_size
+        self._blocks: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @property
+    def block_size(self) -> int:
+        if self._block_size:
+            return self._block_size
+        return int(current_app.config.get('INVOICE_NUMBER_BLOCK_SIZE', 10))
+
+    @staticmethod
+    def _current_epoch(shopkeeper):
+        """The counter row's reset_epoch (None before the row exists)."""
+        return db.session.execute(
+            select(InvoiceSequence.reset_epoch)
+            .where(InvoiceSequence.shopkeeper_id == shopkeeper.shopkeeper_id)
+        ).scalar()
+
+    @staticmethod
+    def _usable(block: Optional[Dict], series, epoch) -> bool:
+        return (block is not None and block['series'] == series and block['epoch'] == epoch
+                and block['next'] <= block['last'])
+
+    def next_number(self, shopkeeper) -> int:
+        """Return the next invoice number for this shopkeeper."""
+        # A block is only used under the numbering settings and reset epoch it was
+        # reserved under; a reset from the profile page changes the epoch in every worker.
+        series = (shopkeeper.invoice_prefix, shopkeeper.invoice_starting_number)
+        epoch = self._current_epoch(shopkeeper)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: never share the parent's blocks
+                self._blocks.clear()
+                self._pid = os.getpid()
+            block = self._blocks.get(shopkeeper.shopkeeper_id)
+            if not self._usable(block, series, epoch):
+                size = self.block_size
+                start, epoch = self._reserve_block(shopkeeper, size)
+                block = {'series': series, 'epoch': epoch, 'next': start, 'last': start + size - 1}
+                self._blocks[shopkeeper.shopkeeper_id] = block
+            number = block['next']
+            block['next'] += 1
+            return number
+
+    def peek(self, shopkeeper) -> int:
+        """Next number this worker would issue, without reserving anything."""
+        series = (shopkeeper.invoice_prefix, shopkeeper.invoice_starting_number)
+        row = db.session.execute(
+            select(InvoiceSequence.next_value, InvoiceSequence.reset_epoch)
+            .where(InvoiceSequence.shopkeeper_id == shopkeeper.shopkeeper_id)
+        ).first()
+        block = self._blocks.get(shopkeeper.shopkeeper_id)
+        if row is not None and self._usable(block, series, row.reset_epoch):
+            return block['next']
+        return row.next_value if row is not None else (shopkeeper.current_invoice_number or 1)
+
+    def reset(self, shopkeeper, starting_number: int):
+        """Restart the shopkeeper's sequence in every worker; joins the caller's transaction."""
+        with self._lock:
+            self._blocks.pop(shopkeeper.shopkeeper_id, None)
+        result = db.session.execute(
+            update(InvoiceSequence)
+            .where(InvoiceSequence.shopkeeper_id == shopkeeper.shopkeeper_id)
+            .values(next_value=starting_number, reset_epoch=InvoiceSequence.reset_epoch + 1)
+        )
+        if result.rowcount == 0:
+            db.session.add(InvoiceSequence(shopkeeper_id=shopkeeper.shopkeeper_id,
+                                           next_value=starting_number, reset_epoch=1))
+
+    def _reserve_block(self, shopkeeper, size: int) -> Tuple[int, int]:
+        """
+        Move the shared counter forward by one block; returns the block start
+        and the reset epoch it belongs to. Runs in its own short transaction so
+        the counter row is locked only for the duration of the UPDATE, not the
+        whole bill transaction.
+        """
+        for attempt in range(RESERVE_ATTEMPTS):
+            try:
+                with db.engine.begin() as conn:
+                    result = conn.execute(
+                        update(InvoiceSequence)
+                        .where(InvoiceSequence.shopkeeper_id == shopkeeper.shopkeeper_id)
+                        .values(next_value=InvoiceSequence.next_value + size)
+                    )
+                    if result.rowcount == 0:
+                        # First bill with block numbering: seed from the legacy counter
+                        start = shopkeeper.current_invoice_number or 1
+                        conn.execute(insert(InvoiceSequence).values(
+                            shopkeeper_id=shopkeeper.shopkeeper_id, next_value=start + size, reset_epoch=0
+                        ))
+                        return start, 0
+                    high, epoch = conn.execute(
+                        select(InvoiceSequence.next_value, InvoiceSequence.reset_epoch)
+                        .where(InvoiceSequence.shopkeeper_id == shopkeeper.shopkeeper_id)
+                    ).one()
+                    return high - size, epoch
+            except IntegrityError:
+                # Another worker seeded the row first; take a block from it instead.
+                # Anything else (e.g. the shopkeeper was deleted) fails every attempt.
+                if attempt == RESERVE_ATTEMPTS - 1:
+                    raise
+
+
+invoice_number_allocator = InvoiceNumberAllocator()
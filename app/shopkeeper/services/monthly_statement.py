@@ -0,0 +1,101 @@
+"""
+Consolidated monthly bill statement for one shop (CA employee export).
+Only the month's bills are read, by a date-range filter on bill_date, and the
+items come back as plain rows streamed in bill order and grouped into bills
+on the fly, so the PDF never needs the shop's bill history in memory.
+"""
+from datetime import date, datetime
+from itertools import groupby
+from typing import Dict, Iterator, Tuple
+
+from flask import render_template
+from sqlalchemy import func, select
+
+from app.models import Bill, BillItem, Product
+from app.extensions import db
+from .pdf_renderer import PDFRenderer
+
+# Item rows fetched from the database per round trip
+STREAM_BATCH_SIZE = 500
+
+
+class MonthlyStatement:
+    """Service class for a shop's month-of-bills PDF statement."""
+
+    @staticmethod
+    def month_range(month: str) -> Tuple[date, date]:
+        """First day of a 'YYYY-MM' month and the first day of the next one."""
+        start = datetime.strptime(month, '%Y-%m').date()
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return start, end
+
+    @staticmethod
+    def month_bills_query(shopkeeper_id: int, month: str):
+        """Bills of one shop dated within the month, oldest first."""
+        start, end = MonthlyStatement.month_range(month)
+        return Bill.query.filter(
+            Bill.shopkeeper_id == shopkeeper_id,
+            Bill.bill_date >= start,
+            Bill.bill_date < end
+        ).order_by(Bill.bill_date, Bill.bill_id)
+
+    @staticmethod
+    def summary(shopkeeper_id: int, month: str) -> Dict:
+        """Bill count and amount totals for the month (one aggregate query)."""
+        start, end = MonthlyStatement.month_range(month)
+        count, total, paid, due = db.session.execute(
+            select(
+                func.count(Bill.bill_id),
+                func.coalesce(func.sum(Bill.total_amount), 0),
+                func.coalesce(func.sum(Bill.paid_amount), 0),
+                func.coalesce(func.sum(Bill.due_amount), 0)
+            ).where(Bill.shopkeeper_id == shopkeeper_id, Bill.bill_date >= start, Bill.bill_date < end)
+        ).one()
+        return {'bill_count': count, 'total_amount': float(total),
+                'paid_amount': float(paid), 'due_amount': float(due)}
+
+    @staticmethod
+    def iter_bills(shopkeeper_id: int, month: str) -> Iterator[Tuple[object, list]]:
+        """
+        Yield (bill_row, item_rows) for the month's bills in date order.
+        Rows are streamed from one query over the month's items joined to their bills.
+        """
+        start, end = MonthlyStatement.month_range(month)
+        rows = db.session.execute(
+            select(
+                Bill.bill_id, Bill.bill_number, Bill.bill_date, Bill.customer_name, Bill.customer_gstin,
+                Bill.gst_type, Bill.payment_status, Bill.total_amount, Bill.paid_amount, Bill.due_amount,
+                func.coalesce(BillItem.product_name, BillItem.custom_product_name,
+                              Product.product_name).label('item_name'),
+                func.coalesce(BillItem.hsn_code, BillItem.custom_hsn_code, Product.hsn_code).label('hsn_code'),
+                func.coalesce(BillItem.gst_rate, BillItem.custom_gst_rate, Product.gst_rate).label('gst_rate'),
+                BillItem.quantity, BillItem.price_per_unit, BillItem.total_price
+            )
+            .select_from(Bill)
+            .outerjoin(BillItem, BillItem.bill_id == Bill.bill_id)
+            .outerjoin(Product, Product.product_id == BillItem.product_id)
+            .where(Bill.shopkeeper_id == shopkeeper_id, Bill.bill_date >= start, Bill.bill_date < end)
+            .order_by(Bill.bill_date, Bill.bill_id, BillItem.bill_item_id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        for _, group in groupby(rows, key=lambda row: row.bill_id):
+            items = list(group)
+            # A bill without items still appears, with no item rows
+            yield items[0], [row for row in items if row.quantity is not None]
+
+    @staticmethod
+    def render_html(shopkeeper, month: str) -> str:
+        return render_template(
+            'ca/monthly_statement.html',
+            shopkeeper=shopkeeper,
+            month=month,
+            month_label=MonthlyStatement.month_range(month)[0].strftime('%B %Y'),
+            summary=MonthlyStatement.summary(shopkeeper.shopkeeper_id, month),
+            bills=MonthlyStatement.iter_bills(shopkeeper.shopkeeper_id, month),
+            generated_at=datetime.now()
+        )
+
+    @staticmethod
+    def render_pdf(shopkeeper, month: str) -> bytes:
+        """The month's statement as one paginated PDF."""
+        return PDFRenderer.write_document(MonthlyStatement.render_html(shopkeeper, month))
@@ -0,0 +1,107 @@
+"""
+Rendered invoice PDF cache on local disk.
+Files are named {shopkeeper_id}_{bill_id}_v{version}_{template}.pdf, so an edited
+bill (new version) or a changed template never hits a stale file. Hits refresh
+the file's mtime and the directory is trimmed oldest-first (LRU) to a size cap.
+"""
+import io
+import os
+import glob
+import tempfile
+from typing import Callable, Optional, Union
+
+from flask import current_app
+
+
+class PDFCache:
+    """Service class for the on-disk rendered PDF cache."""
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(current_app.config.get('PDF_CACHE_ENABLED', True))
+
+    @staticmethod
+    def directory() -> str:
+        path = current_app.config.get('PDF_CACHE_DIR') or os.path.join(os.getcwd(), 'pdf_cache')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def path_for(bill, template_choice: str) -> str:
+        """Cache file for this bill content version rendered with this template."""
+        filename = f"{bill.shopkeeper_id}_{bill.bill_id}_v{bill.version or 1}_{template_choice or 'default'}.pdf"
+        return os.path.join(PDFCache.directory(), filename)
+
+    @staticmethod
+    def get(bill, template_choice: str) -> Optional[str]:
+        """Path of a cached PDF, or None. A hit marks the file as recently used."""
+        path = PDFCache.path_for(bill, template_choice)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    @staticmethod
+    def store(bill, template_choice: str, pdf: bytes) -> str:
+        """Write a rendered PDF atomically and trim the cache; returns its path."""
+        path = PDFCache.path_for(bill, template_choice)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+        PDFCache.evict()
+        return path
+
+    @staticmethod
+    def get_or_render(bill, template_choice: str, render_pdf: Callable[[], bytes]) -> Union[str, io.BytesIO]:
+        """
+        Return something send_file can serve: the cached PDF path, rendering and
+        storing it on a miss, or an in-memory PDF when the cache is disabled.
+        """
+        if not PDFCache.enabled():
+            return io.BytesIO(render_pdf())
+        return PDFCache.get(bill, template_choice) or PDFCache.store(bill, template_choice, render_pdf())
+
+    @staticmethod
+    def evict(max_bytes: Optional[int] = None):
+        """Delete least recently used files until the cache fits in max_bytes."""
+        if max_bytes is None:
+            max_bytes = int(current_app.config.get('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+        entries = []
+        total = 0
+        for entry in os.scandir(PDFCache.directory()):
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Removed by another worker
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            PDFCache._remove(path)
+            total -= size
+            if total <= max_bytes:
+                break
+
+    @staticmethod
+    def invalidate_bill(shopkeeper_id: int, bill_id: int):
+        """Drop every cached version and template of one bill."""
+        for path in glob.glob(os.path.join(PDFCache.directory(), f"{shopkeeper_id}_{bill_id}_v*.pdf")):
+            PDFCache._remove(path)
+
+    @staticmethod
+    def invalidate_shopkeeper(shopkeeper_id: int):
+        """Drop all of a shopkeeper's PDFs (shop details, logo or bank details changed)."""
+        for path in glob.glob(os.path.join(PDFCache.directory(), f"{shopkeeper_id}_*.pdf")):
+            PDFCache._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
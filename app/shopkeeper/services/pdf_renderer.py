@@ -0,0 +1,72 @@
+"""
+WeasyPrint rendering with per-process stylesheet and font reuse.
+Receipt PDFs are styled by static/css/receipt/ (a base sheet plus one per
+template choice) instead of inline CSS. Each process parses those sheets and
+builds its FontConfiguration once, so rendering an invoice is mostly layout.
+Used both in app workers and in render pool processes (no app context needed).
+"""
+import os
+import threading
+from typing import Dict, List
+
+STYLESHEET_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'static', 'css', 'receipt')
+TEMPLATE_CHOICES = ('template1', 'template2', 'template3')
+DEFAULT_TEMPLATE = 'template2'
+
+
+class PDFRenderer:
+    """Service class for turning receipt HTML into PDF bytes."""
+
+    _font_config = None
+    _stylesheets: Dict[str, List] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def font_config(cls):
+        """FontConfiguration shared by every render in this process."""
+        if cls._font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+            with cls._lock:
+                if cls._font_config is None:
+                    cls._font_config = FontConfiguration()
+        return cls._font_config
+
+    @classmethod
+    def stylesheets(cls, template_choice: str) -> List:
+        """Parsed base and header stylesheets for a template choice, cached per process."""
+        if template_choice not in TEMPLATE_CHOICES:
+            template_choice = DEFAULT_TEMPLATE
+        sheets = cls._stylesheets.get(template_choice)
+        if sheets is None:
+            from weasyprint import CSS
+            font_config = cls.font_config()
+            with cls._lock:
+                sheets = cls._stylesheets.get(template_choice)
+                if sheets is None:
+                    sheets = [
+                        CSS(filename=os.path.join(STYLESHEET_DIR, name), font_config=font_config)
+                        for name in ('receipt_pdf.css', f'receipt_{template_choice}.css')
+                    ]
+                    cls._stylesheets[template_choice] = sheets
+        return sheets
+
+    @classmethod
+    def warm(cls):
+        """Parse every template's stylesheets up front (process pool initializer)."""
+        for template_choice in TEMPLATE_CHOICES:
+            cls.stylesheets(template_choice)
+
+    @classmethod
+    def write_pdf(cls, html: str, template_choice: str) -> bytes:
+        """Render receipt HTML (rendered with for_pdf=True) to PDF bytes."""
+        from weasyprint import HTML
+        return HTML(string=html).write_pdf(
+            stylesheets=cls.stylesheets(template_choice),
+            font_config=cls.font_config()
+        )
+
+    @classmethod
+    def write_document(cls, html: str) -> bytes:
+        """Render a self-styled document (not a receipt) with the shared font configuration."""
+        from weasyprint import HTML
+        return HTML(string=html).write_pdf(font_config=cls.font_config())
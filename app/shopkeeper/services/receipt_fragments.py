@@ -0,0 +1,62 @@
+"""
+Cache of the per-shopkeeper receipt blocks (logo and shop name header, From
+block, bank details footer) that are identical on every bill of a shop.
+Entries are keyed on the shop fields they show as well as the shopkeeper, so
+a worker that missed an invalidation still never serves stale details;
+profile_edit drops a shop's entries so they don't linger.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from flask import current_app
+from markupsafe import Markup
+
+FRAGMENTS_TEMPLATE = 'shopkeeper/_receipt_fragments.html'
+FRAGMENT_NAMES = ('branding', 'shop_from', 'footer')
+# Shopkeeper columns the fragments render
+FRAGMENT_FIELDS = ('template_choice', 'shop_name', 'logo_path', 'address', 'gst_number',
+                   'bank_name', 'account_number', 'ifsc_code')
+
+
+class ReceiptFragments:
+    """Service class for cached per-shopkeeper receipt fragments."""
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _key(shopkeeper) -> tuple:
+        return (shopkeeper.shopkeeper_id,) + tuple(getattr(shopkeeper, field) for field in FRAGMENT_FIELDS)
+
+    @staticmethod
+    def render(shopkeeper) -> Dict[str, Markup]:
+        """Render every fragment for a shopkeeper (uncached)."""
+        module = current_app.jinja_env.get_template(FRAGMENTS_TEMPLATE).module
+        return {name: Markup(getattr(module, name)(shopkeeper)) for name in FRAGMENT_NAMES}
+
+    @staticmethod
+    def for_shopkeeper(shopkeeper) -> Dict[str, Markup]:
+        """Fragments for bill_receipt.html, from the cache when the shop details are unchanged."""
+        key = ReceiptFragments._key(shopkeeper)
+        cache = ReceiptFragments._cache
+        with ReceiptFragments._lock:
+            fragments = cache.get(key)
+            if fragments is not None:
+                cache.move_to_end(key)
+                return fragments
+
+        fragments = ReceiptFragments.render(shopkeeper)
+        max_entries = int(current_app.config.get('RECEIPT_FRAGMENT_CACHE_SIZE', 1024))
+        with ReceiptFragments._lock:
+            cache[key] = fragments
+            while len(cache) > max_entries:
+                cache.popitem(last=False)
+        return fragments
+
+    @staticmethod
+    def invalidate_shopkeeper(shopkeeper_id: int):
+        """Drop a shopkeeper's cached fragments in this process."""
+        with ReceiptFragments._lock:
+            for key in [key for key in ReceiptFragments._cache if key[0] == shopkeeper_id]:
+                del ReceiptFragments._cache[key]
@@ -0,0 +1,70 @@
+"""
+Receipt data loader shared by the shopkeeper and CA receipt views and PDFs.
+Loads a bill with its items, shopkeeper and only the referenced products in
+one joined query, so the cost follows the bill size, not the catalog size.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, load_only
+
+from app.models import Bill, BillItem, Product
+from app.extensions import db
+from .bill_service import BillService
+from .gst_engine import GSTEngine
+from .receipt_fragments import ReceiptFragments
+
+
+class ReceiptService:
+    """Service class for building receipt template data."""
+
+    @staticmethod
+    def load_bill(bill_id: int) -> Optional[Bill]:
+        """Fetch a bill, its items, their products (receipt columns only) and its shopkeeper."""
+        return db.session.execute(
+            select(Bill)
+            .options(
+                joinedload(Bill.shopkeeper),
+                joinedload(Bill.bill_items).joinedload(BillItem.product).load_only(
+                    Product.product_id, Product.product_name, Product.gst_rate, Product.hsn_code
+                )
+            )
+            .where(Bill.bill_id == bill_id)
+        ).unique().scalar_one_or_none()
+
+    @staticmethod
+    def load_bills(bill_ids: List[int]) -> List[Bill]:
+        """load_bill for many bills at once, in bill_ids order."""
+        bills = db.session.execute(
+            select(Bill)
+            .options(
+                joinedload(Bill.shopkeeper),
+                joinedload(Bill.bill_items).joinedload(BillItem.product).load_only(
+                    Product.product_id, Product.product_name, Product.gst_rate, Product.hsn_code
+                )
+            )
+            .where(Bill.bill_id.in_(bill_ids))
+        ).unique().scalars().all()
+        position = {bill_id: i for i, bill_id in enumerate(bill_ids)}
+        return sorted(bills, key=lambda bill: position[bill.bill_id])
+
+    @staticmethod
+    def build_context(bill: Bill) -> Dict:
+        """Template variables for shopkeeper/bill_receipt.html from a loaded bill."""
+        # Products came with the items; only rows without a GST snapshot use them
+        products_by_id = {str(item.product_id): item.product
+                          for item in bill.bill_items if item.product_id and item.product is not None}
+        receipt = GSTEngine.receipt_summary(BillService.receipt_lines(bill.bill_items, products_by_id))
+        return {
+            'bill': bill,
+            'bill_items_data': receipt['lines'],
+            'shopkeeper': bill.shopkeeper,
+            'fragments': ReceiptFragments.for_shopkeeper(bill.shopkeeper),
+            'products': products_by_id,
+            'gst_summary_by_rate': receipt['gst_summary_by_rate'],
+            'total_taxable_amount': receipt['total_taxable_amount'],
+            'total_cgst_amount': receipt['total_cgst_amount'],
+            'total_sgst_amount': receipt['total_sgst_amount'],
+            'total_gst_amount': receipt['total_gst_amount'],
+            'overall_grand_total': receipt['overall_grand_total'],
+        }
@@ -0,0 +1,220 @@
+"""
+Background PDF rendering.
+Requests render the receipt HTML (cheap) and hand WeasyPrint's layout/PDF step
+(expensive) to a process pool, getting a job id back. Job status lives in small
+JSON files next to the PDF cache so any gunicorn worker can answer a poll, and
+finished PDFs land in the PDF cache. Each worker process runs at most
+PDF_RENDER_WORKERS renders and queues at most PDF_RENDER_QUEUE_DEPTH jobs;
+beyond that new jobs are refused so PDF load cannot starve billing.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+from flask import current_app, flash, jsonify, redirect, render_template, request, send_file, url_for
+
+from .pdf_cache import PDFCache
+from .pdf_renderer import PDFRenderer
+
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+
+
+class RenderQueueFull(Exception):
+    """Raised when this worker already has PDF_RENDER_QUEUE_DEPTH jobs in flight."""
+
+
+def _write_status(status_path: str, status: Dict):
+    """Replace a job status file atomically."""
+    tmp_path = f"{status_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, status_path)
+
+
+def _render_job(html: str, template_choice: str, pdf_path: str, status_path: str, status: Dict):
+    """Runs in a pool process: lay out the HTML, write the PDF, record the outcome."""
+    _write_status(status_path, dict(status, state='running', started_at=time.time()))
+    try:
+        pdf = PDFRenderer.write_pdf(html, template_choice)
+        tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, pdf_path)
+    except Exception as e:
+        _write_status(status_path, dict(status, state='failed', error=str(e), finished_at=time.time()))
+        raise
+    _write_status(status_path, dict(status, state='done', finished_at=time.time()))
+
+
+class PDFRenderPool:
+    """Per-process render pool with file-backed job status."""
+
+    def __init__(self):
+        self._executor = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def enabled() -> bool:
+        return int(current_app.config.get('PDF_RENDER_WORKERS', 0)) > 0
+
+    @staticmethod
+    def jobs_dir() -> str:
+        path = os.path.join(PDFCache.directory(), 'jobs')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def status_path(job_id: str) -> str:
+        return os.path.join(PDFRenderPool.jobs_dir(), f"{job_id}.json")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._pid != os.getpid():
+            # Forked worker: the parent's pool and futures are not ours
+            self._executor = None
+            self._in_flight = set()
+            self._pid = os.getpid()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=int(current_app.config.get('PDF_RENDER_WORKERS', 2)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=PDFRenderer.warm
+            )
+        return self._executor
+
+    def submit(self, bill, template_choice: str, render_html: Callable[[], str], user_id: int) -> Dict:
+        """
+        Start rendering a bill's PDF and return its job status.
+        A bill already in the PDF cache gets a job that is done immediately.
+        Raises RenderQueueFull when this worker has no queue room left.
+        """
+        job_id = uuid.uuid4().hex
+        status = {
+            'job_id': job_id,
+            'bill_id': bill.bill_id,
+            'bill_number': bill.bill_number,
+            'user_id': user_id,
+            'pdf_path': PDFCache.path_for(bill, template_choice),
+            'created_at': time.time(),
+        }
+        status_path = PDFRenderPool.status_path(job_id)
+
+        if PDFCache.get(bill, template_choice):
+            status.update(state='done', finished_at=time.time())
+            _write_status(status_path, status)
+            return status
+
+        max_depth = int(current_app.config.get('PDF_RENDER_QUEUE_DEPTH', 8))
+        with self._lock:
+            executor = self._get_executor()
+            if len(self._in_flight) >= max_depth:
+                raise RenderQueueFull()
+            status['state'] = 'queued'
+            _write_status(status_path, status)
+            future = executor.submit(_render_job, render_html(), template_choice,
+                                     status['pdf_path'], status_path, status)
+            self._in_flight.add(future)
+        future.add_done_callback(lambda f: self._finished(f, status_path, status))
+        # Pool processes write straight into the cache; keep it within its size cap
+        PDFCache.evict()
+        self._prune_jobs()
+        return status
+
+    def _finished(self, future, status_path: str, status: Dict):
+        """Done-callback (runs outside the app context): release the slot, record crashes."""
+        with self._lock:
+            self._in_flight.discard(future)
+        error = future.exception()
+        if error is None:
+            return
+        current = PDFRenderPool._load_status(status_path) or status
+        if current.get('state') != 'failed':
+            # The pool process died before it could record the failure
+            _write_status(status_path, dict(current, state='failed', error=str(error), finished_at=time.time()))
+        if error.__class__.__name__ == 'BrokenProcessPool':
+            with self._lock:
+                self._executor = None
+
+    @staticmethod
+    def read_status(job_id: str) -> Optional[Dict]:
+        """Current status of a job, from any worker process."""
+        if not job_id.isalnum():
+            return None
+        return PDFRenderPool._load_status(PDFRenderPool.status_path(job_id))
+
+    @staticmethod
+    def _load_status(status_path: str) -> Optional[Dict]:
+        try:
+            with open(status_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _prune_jobs():
+        """Remove job status files older than a day."""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for entry in os.scandir(PDFRenderPool.jobs_dir()):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def public_status(status: Dict) -> Dict:
+        """Job status as returned by the API (no filesystem paths)."""
+        public = {key: status.get(key) for key in ('job_id', 'bill_id', 'state', 'error')}
+        public['status_url'] = url_for('api.render_job_status', job_id=status['job_id'])
+        if status.get('state') == 'done':
+            public['download_url'] = url_for('api.render_job_download', job_id=status['job_id'])
+        return public
+
+    @staticmethod
+    def wants_json() -> bool:
+        """True for API routes and clients that ask for JSON rather than a page."""
+        return request.blueprint == 'api' or request.accept_mimetypes.best == 'application/json'
+
+    def pdf_response(self, bill, template_choice: str, render_html: Callable[[], str], user_id: int,
+                     busy_url: Optional[str] = None):
+        """
+        Response for a bill PDF download: the cached file if there is one,
+        otherwise a background render job (a polling page, or 202 JSON for API
+        clients). Renders inline when the pool is disabled. When the queue is
+        full, API clients get 503 JSON with Retry-After and browsers are sent
+        back to busy_url (default: the referring page) with a flash message.
+        """
+        download_name = f'bill_{bill.bill_number}.pdf'
+        if not self.enabled() or not PDFCache.enabled():
+            pdf = PDFCache.get_or_render(bill, template_choice,
+                                         lambda: PDFRenderer.write_pdf(render_html(), template_choice))
+            return send_file(pdf, download_name=download_name, mimetype='application/pdf')
+
+        cached = PDFCache.get(bill, template_choice)
+        if cached:
+            return send_file(cached, download_name=download_name, mimetype='application/pdf')
+
+        try:
+            status = self.submit(bill, template_choice, render_html, user_id)
+        except RenderQueueFull:
+            if not self.wants_json():
+                flash('PDF rendering is busy right now. Please try the download again in a few seconds.', 'warning')
+                return redirect(busy_url or request.referrer or url_for('shopkeeper.manage_bills'))
+            response = jsonify({'success': False, 'message': 'PDF rendering is busy, please retry shortly.'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+
+        public = self.public_status(status)
+        if self.wants_json():
+            return jsonify(public), 202
+        return render_template('shopkeeper/pdf_render_status.html', job=public, bill=bill), 202
+
+
+render_pool = PDFRenderPool()
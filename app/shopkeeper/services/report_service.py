@@ -7,8 +7,10 @@ from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional, Tuple
 from sqlalchemy import func, and_, extract
 
-from app.models import Bill, BillItem, Product, Customer, CustomerLedger
+from app.models import Bill, BillItem, Product, Customer, CustomerLedger, DailySalesRollup
 from app.extensions import db
+from .sales_rollup import SalesRollupService
+from .gst_return_engine import GSTReturnEngine
 
 
 class ReportService:
@@ -59,18 +61,20 @@ class ReportService:
         if year is None:
             year = datetime.now().year
         
-        # Query monthly totals
+        # Query monthly totals from the daily rollup (at most 366 rows)
+        month = extract('month', DailySalesRollup.sales_date)
         monthly_data = db.session.query(
-            extract('month', Bill.bill_date).label('month'),
-            func.count(Bill.bill_id).label('bill_count'),
-            func.sum(Bill.total_amount).label('total_sales'),
-            func.sum(Bill.paid_amount).label('total_collected')
+            month.label('month'),
+            func.sum(DailySalesRollup.bill_count).label('bill_count'),
+            func.sum(DailySalesRollup.gross_total).label('total_sales'),
+            func.sum(DailySalesRollup.paid_total).label('total_collected')
         ).filter(
             and_(
-                Bill.shopkeeper_id == shopkeeper_id,
-                extract('year', Bill.bill_date) == year
+                DailySalesRollup.shopkeeper_id == shopkeeper_id,
+                DailySalesRollup.sales_date >= date(year, 1, 1),
+                DailySalesRollup.sales_date <= date(year, 12, 31)
             )
-        ).group_by(extract('month', Bill.bill_date)).all()
+        ).group_by(month).all()
         
         # Initialize all 12 months
         months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
@@ -98,18 +102,8 @@ class ReportService:
         end_date = date.today()
         start_date = end_date - timedelta(days=days-1)
         
-        # Query daily totals
-        daily_data = db.session.query(
-            Bill.bill_date,
-            func.count(Bill.bill_id).label('bill_count'),
-            func.sum(Bill.total_amount).label('total_sales')
-        ).filter(
-            and_(
-                Bill.shopkeeper_id == shopkeeper_id,
-                Bill.bill_date >= start_date,
-                Bill.bill_date <= end_date
-            )
-        ).group_by(Bill.bill_date).all()
+        # Daily totals, one rollup row per day
+        daily_dict = SalesRollupService.daily_rows(shopkeeper_id, start_date, end_date)
         
         # Create date range
         date_range = [(start_date + timedelta(days=x)) for x in range(days)]
@@ -122,11 +116,10 @@ class ReportService:
         }
         
         # Fill actual data
-        daily_dict = {row.bill_date: row for row in daily_data}
         for i, current_date in enumerate(date_range):
             if current_date in daily_dict:
                 row = daily_dict[current_date]
-                chart_data['sales'][i] = float(row.total_sales or 0)
+                chart_data['sales'][i] = float(row.gross_total or 0)
                 chart_data['bill_counts'][i] = int(row.bill_count or 0)
         
         return chart_data
@@ -207,60 +200,22 @@ class ReportService:
     
     @staticmethod
     def get_gst_report(shopkeeper_id: int, month: int, year: int) -> Dict:
-        """Get GST report for a specific month."""
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
-        
-        # Get bills for the month
-        bills = Bill.query.filter(
-            and_(
-                Bill.shopkeeper_id == shopkeeper_id,
-                Bill.bill_date >= start_date,
-                Bill.bill_date <= end_date
-            )
-        ).all()
-        
-        # Group by GST rates
-        gst_summary = {}
-        total_taxable = Decimal('0')
-        total_gst = Decimal('0')
-        
-        for bill in bills:
-            bill_items = BillItem.query.filter_by(bill_id=bill.bill_id).all()
-            
-            for item in bill_items:
-                gst_rate = item.gst_rate or Decimal('0')
-                taxable_value = item.subtotal - (item.discount_amount or Decimal('0'))
-                gst_amount = item.gst_amount or Decimal('0')
-                
-                if gst_rate not in gst_summary:
-                    gst_summary[gst_rate] = {
-                        'taxable_value': Decimal('0'),
-                        'gst_amount': Decimal('0')
-                    }
-                
-                gst_summary[gst_rate]['taxable_value'] += taxable_value
-                gst_summary[gst_rate]['gst_amount'] += gst_amount
-                
-                total_taxable += taxable_value
-                total_gst += gst_amount
-        
+        """Get GST report for a specific month (rate-wise totals from GSTReturnEngine)."""
+        summary = GSTReturnEngine.summary(shopkeeper_id, f"{year}-{month:02d}")
+        gstr3b = summary['gstr3b']
         return {
             'month': month,
             'year': year,
-            'period': f"{start_date.strftime('%B %Y')}",
+            'period': date(year, month, 1).strftime('%B %Y'),
             'gst_breakdown': {
-                str(rate): {
-                    'taxable_value': float(data['taxable_value']),
-                    'gst_amount': float(data['gst_amount'])
-                } for rate, data in gst_summary.items()
+                row['gst_rate']: {
+                    'taxable_value': row['taxable_value'],
+                    'gst_amount': row['total_tax']
+                } for row in summary['rate_wise']
             },
-            'total_taxable_value': float(total_taxable),
-            'total_gst_amount': float(total_gst),
-            'total_invoice_value': float(total_taxable + total_gst)
+            'total_taxable_value': gstr3b['taxable_value'],
+            'total_gst_amount': gstr3b['total_tax'],
+            'total_invoice_value': round(gstr3b['taxable_value'] + gstr3b['total_tax'], 2)
         }
     
     @staticmethod
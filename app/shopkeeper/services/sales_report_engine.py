@@ -0,0 +1,84 @@
+"""
+Sales report engine for the per-day sales table.
+Days are totalled by a GROUP BY on bill_date in the database (served by
+IX_bills_shopkeeper_date) and the table is paged by date with a keyset
+cursor: each page covers a fixed number of days after the last date shown,
+so a page reads at most that many grouped rows however long the range is.
+"""
+import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, select
+
+from app.models import Bill
+from app.extensions import db
+
+# Days per page of the sales report table
+REPORT_PAGE_DAYS = 31
+PAYMENT_STATUSES = ('Paid', 'Unpaid', 'Partial')
+# Longest date range a daily sales chart series covers
+MAX_SERIES_DAYS = 366
+
+
+class SalesReportEngine:
+    """Service class for grouped, paged sales report data."""
+
+    @staticmethod
+    def daily_summary(shopkeeper_id: int, start_date: datetime.date,
+                      end_date: datetime.date) -> Dict[datetime.date, Dict]:
+        """Bill count, amount and payment status counts per day that has bills."""
+        status_counts = [
+            func.coalesce(func.sum(case((Bill.payment_status == status, 1), else_=0)), 0).label(status.lower())
+            for status in PAYMENT_STATUSES
+        ]
+        rows = db.session.execute(
+            select(
+                Bill.bill_date,
+                func.count(Bill.bill_id).label('bill_count'),
+                func.coalesce(func.sum(Bill.total_amount), 0).label('total_amount'),
+                *status_counts
+            ).where(
+                Bill.shopkeeper_id == shopkeeper_id,
+                Bill.bill_date >= start_date,
+                Bill.bill_date <= end_date
+            ).group_by(Bill.bill_date)
+        )
+        return {
+            row.bill_date: {
+                'bill_count': int(row.bill_count),
+                'total_amount': float(row.total_amount),
+                'paid': int(row.paid),
+                'unpaid': int(row.unpaid),
+                'partial': int(row.partial),
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def page(shopkeeper_id: int, start_date: datetime.date, end_date: datetime.date,
+             after: Optional[datetime.date] = None, page_days: int = REPORT_PAGE_DAYS) -> Dict:
+        """
+        One page of the per-day table: every date after `after` (or from start_date),
+        up to page_days of them, with zero rows for days without bills. Returns
+        the rows plus the `after` cursors of the next and previous pages.
+        """
+        first_day = start_date if after is None else max(start_date, after + datetime.timedelta(days=1))
+        last_day = min(end_date, first_day + datetime.timedelta(days=page_days - 1))
+        summary = SalesReportEngine.daily_summary(shopkeeper_id, first_day, last_day) \
+            if first_day <= last_day else {}
+
+        rows: List[Dict] = []
+        day = first_day
+        while day <= last_day:
+            values = summary.get(day) or {'bill_count': 0, 'total_amount': 0, 'paid': 0, 'unpaid': 0, 'partial': 0}
+            rows.append(dict(values, date=day.strftime('%Y-%m-%d')))
+            day += datetime.timedelta(days=1)
+
+        # Dates are dense, so the previous page's cursor is plain arithmetic
+        prev_first_day = first_day - datetime.timedelta(days=page_days)
+        return {
+            'rows': rows,
+            'next_after': last_day if last_day < end_date else None,
+            'has_prev': first_day > start_date,
+            'prev_after': prev_first_day - datetime.timedelta(days=1) if prev_first_day > start_date else None,
+        }
@@ -0,0 +1,212 @@
+"""
+Daily sales rollup maintenance and reads.
+Session listeners note the (shopkeeper, day) of every bill or bill item that
+is flushed; once the transaction commits, just those days are re-aggregated
+from bills into daily_sales_rollup. Re-aggregating a day (rather than adding
+deltas) keeps rows exact even after bulk item deletes or edits outside the
+ORM. Charts and KPIs then read one row per day instead of scanning bills.
+The refresh never raises out of commit (the bills are already saved): days
+it fails on are logged and retried with the worker's next refresh, and
+`flask rebuild-sales-rollup` repairs them in any case. It is run from the
+dashboard cache's after_commit listener, before cached dashboards are
+invalidated, so no dashboard is rebuilt from rollup rows the commit changed.
+"""
+import datetime
+import threading
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import attributes
+
+from app.models import Bill, BillItem, DailySalesRollup
+from app.extensions import db
+
+ROLLUP_DAYS_KEY = 'rollup_days'
+ROLLUP_COLUMNS = ('bill_count', 'gross_total', 'paid_total', 'due_total', 'gst_total')
+# Days whose post-commit refresh failed in this worker, retried with its next refresh
+_failed_days: Set[Tuple[int, datetime.date]] = set()
+_failed_days_lock = threading.Lock()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_rollup_days(session, flush_context):
+    """Remember which shopkeeper days this flush touched."""
+    days = session.info.setdefault(ROLLUP_DAYS_KEY, set())
+    item_bill_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Bill):
+            days.add((obj.shopkeeper_id, obj.bill_date))
+            # A bill moved to another date or shop also changes the day it left
+            shop_history = attributes.get_history(obj, 'shopkeeper_id')
+            date_history = attributes.get_history(obj, 'bill_date')
+            if date_history.deleted or shop_history.deleted:
+                days.add(((shop_history.deleted or [obj.shopkeeper_id])[0],
+                          (date_history.deleted or [obj.bill_date])[0]))
+        elif isinstance(obj, BillItem) and obj.bill_id is not None:
+            item_bill_ids.add(obj.bill_id)
+    if item_bill_ids:
+        days.update(session.connection().execute(
+            select(Bill.shopkeeper_id, Bill.bill_date).where(Bill.bill_id.in_(item_bill_ids))
+        ).all())
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_rollup_days(session):
+    session.info.pop(ROLLUP_DAYS_KEY, None)
+
+
+class SalesRollupService:
+    """Service class for the daily_sales_rollup table."""
+
+    @staticmethod
+    def mark_changed(shopkeeper_id: int, dates: Iterable[datetime.date]):
+        """Queue days written outside the ORM (Core inserts) for refresh on commit."""
+        days = db.session.info.setdefault(ROLLUP_DAYS_KEY, set())
+        days.update((shopkeeper_id, day) for day in dates)
+
+    @staticmethod
+    def refresh_committed(session) -> Set[Tuple[int, datetime.date]]:
+        """Refresh the days a just-committed session touched; returns the days refreshed."""
+        days = session.info.pop(ROLLUP_DAYS_KEY, None)
+        if not days:
+            return set()
+        return SalesRollupService.refresh_after_commit(days)
+
+    @staticmethod
+    def refresh_after_commit(days: Set[Tuple[int, datetime.date]]) -> Set[Tuple[int, datetime.date]]:
+        """
+        Refresh days (plus earlier failures) after a commit and return them; on
+        any error logs, keeps the days for the next refresh and returns none.
+        """
+        with _failed_days_lock:
+            days = set(days) | _failed_days
+            _failed_days.clear()
+        try:
+            SalesRollupService.refresh(days)
+        except Exception:
+            with _failed_days_lock:
+                _failed_days.update(days)
+            current_app.logger.exception(
+                "Sales rollup refresh failed for %d day(s); retrying on the next bill write "
+                "(or run: flask rebuild-sales-rollup)", len(days))
+            return set()
+        return days
+
+    @staticmethod
+    def pending_days() -> Set[Tuple[int, datetime.date]]:
+        """Days this worker failed to refresh and has not retried yet."""
+        with _failed_days_lock:
+            return set(_failed_days)
+
+    @staticmethod
+    def aggregate(conn, shopkeeper_id: int, dates: Optional[Iterable[datetime.date]] = None) -> Dict:
+        """Rollup values per day computed from bills (all days when dates is None)."""
+        bill_filter = [Bill.shopkeeper_id == shopkeeper_id]
+        if dates is not None:
+            bill_filter.append(Bill.bill_date.in_(list(dates)))
+
+        totals = {}
+        for row in conn.execute(
+            select(
+                Bill.bill_date,
+                func.count(Bill.bill_id),
+                func.coalesce(func.sum(Bill.total_amount), 0),
+                func.coalesce(func.sum(Bill.paid_amount), 0),
+                func.coalesce(func.sum(Bill.due_amount), 0)
+            ).where(*bill_filter).group_by(Bill.bill_date)
+        ):
+            totals[row[0]] = dict(zip(ROLLUP_COLUMNS, (row[1], row[2], row[3], row[4], 0)))
+
+        for day, gst in conn.execute(
+            select(
+                Bill.bill_date,
+                func.coalesce(func.sum(func.coalesce(BillItem.cgst_amount, 0) + func.coalesce(BillItem.sgst_amount, 0)), 0)
+            ).join(BillItem, BillItem.bill_id == Bill.bill_id).where(*bill_filter).group_by(Bill.bill_date)
+        ):
+            if day in totals:
+                totals[day]['gst_total'] = gst
+        return totals
+
+    @staticmethod
+    def refresh(days: Set[Tuple[int, datetime.date]], retries: int = 1):
+        """Re-aggregate the given (shopkeeper_id, date) days in their own transaction."""
+        by_shop = defaultdict(set)
+        for shopkeeper_id, day in days:
+            if shopkeeper_id is not None and day is not None:
+                # Bills created in code may carry a datetime; the column stores the date
+                by_shop[shopkeeper_id].add(day.date() if isinstance(day, datetime.datetime) else day)
+        try:
+            with db.engine.begin() as conn:
+                for shopkeeper_id, dates in by_shop.items():
+                    totals = SalesRollupService.aggregate(conn, shopkeeper_id, dates)
+                    for day in dates:
+                        SalesRollupService._write_day(conn, shopkeeper_id, day, totals.get(day))
+        except IntegrityError:
+            # Another worker inserted the same day first; its row now exists, so update it
+            if retries <= 0:
+                raise
+            SalesRollupService.refresh(days, retries - 1)
+
+    @staticmethod
+    def _write_day(conn, shopkeeper_id: int, day: datetime.date, values: Optional[Dict]):
+        key = (DailySalesRollup.shopkeeper_id == shopkeeper_id) & (DailySalesRollup.sales_date == day)
+        if values is None:
+            conn.execute(delete(DailySalesRollup).where(key))
+            return
+        values = dict(values, updated_at=datetime.datetime.now())
+        if conn.execute(update(DailySalesRollup).where(key).values(**values)).rowcount == 0:
+            conn.execute(insert(DailySalesRollup).values(shopkeeper_id=shopkeeper_id, sales_date=day, **values))
+
+    @staticmethod
+    def rebuild(shopkeeper_id: Optional[int] = None) -> int:
+        """Recreate rollup rows from bills, one shopkeeper per transaction; returns rows written."""
+        if shopkeeper_id is None:
+            shopkeeper_ids = db.session.execute(select(Bill.shopkeeper_id).distinct()).scalars().all()
+        else:
+            shopkeeper_ids = [shopkeeper_id]
+        db.session.commit()  # Don't hold the caller's transaction open while rebuilding
+        if shopkeeper_id is None:
+            # Shops that no longer have any bills
+            with db.engine.begin() as conn:
+                conn.execute(delete(DailySalesRollup).where(DailySalesRollup.shopkeeper_id.not_in(shopkeeper_ids)))
+
+        written = 0
+        now = datetime.datetime.now()
+        for sid in shopkeeper_ids:
+            with db.engine.begin() as conn:
+                totals = SalesRollupService.aggregate(conn, sid)
+                conn.execute(delete(DailySalesRollup).where(DailySalesRollup.shopkeeper_id == sid))
+                if totals:
+                    conn.execute(insert(DailySalesRollup), [
+                        dict(values, shopkeeper_id=sid, sales_date=day, updated_at=now)
+                        for day, values in totals.items()
+                    ])
+                written += len(totals)
+        return written
+
+    @staticmethod
+    def daily_rows(shopkeeper_id: int, start_date: datetime.date, end_date: datetime.date) -> Dict:
+        """Rollup rows for a date range, keyed by date."""
+        rows = db.session.execute(
+            select(DailySalesRollup).where(
+                DailySalesRollup.shopkeeper_id == shopkeeper_id,
+                DailySalesRollup.sales_date >= start_date,
+                DailySalesRollup.sales_date <= end_date
+            )
+        ).scalars()
+        return {row.sales_date: row for row in rows}
+
+    @staticmethod
+    def last_updated(shopkeeper_id: int, start_date: datetime.date, end_date: datetime.date):
+        """Latest refresh time of the rollup rows in a date range (None when there are none)."""
+        return db.session.execute(
+            select(func.max(DailySalesRollup.updated_at)).where(
+                DailySalesRollup.shopkeeper_id == shopkeeper_id,
+                DailySalesRollup.sales_date >= start_date,
+                DailySalesRollup.sales_date <= end_date
+            )
+        ).scalar()
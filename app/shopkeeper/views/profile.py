@@ -5,23 +5,23 @@ Extracted from original routes.py - maintaining all original logic.
 from flask import render_template, request, flash, redirect, url_for, current_app, g
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from datetime import datetime
+import itertools
 import os
 
 from ..utils import shopkeeper_required, update_shopkeeper_verification
 from app.models import Shopkeeper, CharteredAccountant, CAConnection, ShopConnection
 from app.extensions import db
+from ..services.invoice_sequence import invoice_number_allocator
+from ..services import PDFCache, ReceiptFragments
 
 
 def generate_next_invoice_number(shopkeeper):
-    """Generate the next invoice number and increment the counter."""
+    """Generate the next invoice number from this worker's reserved block."""
+    number = invoice_number_allocator.next_number(shopkeeper)
     # Format the number with leading zeros (e.g., 01, 02, 03)
-    formatted_number = str(shopkeeper.current_invoice_number).zfill(2)
-    invoice_number = f"{shopkeeper.invoice_prefix}-{formatted_number}"
-    
-    # Increment the counter for next use
-    shopkeeper.current_invoice_number += 1
-    
-    return invoice_number
+    formatted_number = str(number).zfill(2)
+    return f"{shopkeeper.invoice_prefix}-{formatted_number}"
 
 def reset_invoice_numbering(shopkeeper, prefix=None, starting_number=None):
     """Reset invoice numbering with new prefix and/or starting number."""
@@ -30,10 +30,11 @@ def reset_invoice_numbering(shopkeeper, prefix=None, starting_number=None):
     if starting_number is not None:
         shopkeeper.invoice_starting_number = starting_number
         shopkeeper.current_invoice_number = starting_number
+        invoice_number_allocator.reset(shopkeeper, starting_number)
 
 def preview_next_invoice_number(shopkeeper):
     """Preview what the next invoice number will be without incrementing."""
-    formatted_number = str(shopkeeper.current_invoice_number).zfill(2)
+    formatted_number = str(invoice_number_allocator.peek(shopkeeper)).zfill(2)
     return f"{shopkeeper.invoice_prefix}-{formatted_number}"
 
 def is_custom_numbering_enabled(shopkeeper):
@@ -43,6 +44,15 @@ def is_custom_numbering_enabled(shopkeeper):
             shopkeeper.invoice_starting_number is not None and
             shopkeeper.current_invoice_number is not None)
 
+def bill_number_factory(shopkeeper):
+    """Return a callable handing out bill numbers for bulk ingestion."""
+    if is_custom_numbering_enabled(shopkeeper):
+        return lambda: generate_next_invoice_number(shopkeeper)
+    # Timestamp numbers as in generate_bill_pdf, suffixed so a batch never repeats one
+    stamp = int(datetime.now().timestamp())
+    counter = itertools.count(1)
+    return lambda: f"BILL{stamp}-{next(counter)}"
+
 
 def register_routes(bp):
     """Register profile management routes to the blueprint."""
@@ -96,6 +106,9 @@ def register_routes(bp):
                     flash('Invalid starting number provided.', 'error')
             
             db.session.commit()
+            # Shop details, bank details and template all appear on cached invoices
+            PDFCache.invalidate_shopkeeper(shopkeeper.shopkeeper_id)
+            ReceiptFragments.invalidate_shopkeeper(shopkeeper.shopkeeper_id)
             flash('Profile updated successfully.', 'success')
             return redirect(url_for('shopkeeper.profile'))
         return render_template('shopkeeper/profile_edit.html', 
@@ -157,6 +170,9 @@ def register_routes(bp):
             elif doc_type == 'bank_statement':
                 shopkeeper.bank_statement_path = rel_path
             db.session.commit()
+            if doc_type == 'logo':
+                PDFCache.invalidate_shopkeeper(shopkeeper.shopkeeper_id)
+                ReceiptFragments.invalidate_shopkeeper(shopkeeper.shopkeeper_id)
             update_shopkeeper_verification(shopkeeper)
             flash(f'{doc_type.replace("_", " ").title()} uploaded successfully.', 'success')
         else:
@@ -187,6 +203,9 @@ def register_routes(bp):
         elif doc_type == 'bank_statement' and shopkeeper.bank_statement_path:
             shopkeeper.bank_statement_path = None
         db.session.commit()
+        if doc_type == 'logo':
+            PDFCache.invalidate_shopkeeper(shopkeeper.shopkeeper_id)
+            ReceiptFragments.invalidate_shopkeeper(shopkeeper.shopkeeper_id)
         update_shopkeeper_verification(shopkeeper)
         flash(f'{doc_type.replace("_", " ").title()} deleted successfully.', 'success')
         return redirect(url_for('shopkeeper.profile'))
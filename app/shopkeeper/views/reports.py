@@ -7,8 +7,9 @@ from flask_login import login_required, current_user
 import datetime
 
 from ..utils import shopkeeper_required
-from app.models import Bill, Shopkeeper
-from app.extensions import db
+from ..services import SalesReportEngine
+from ..services.sales_report_engine import MAX_SERIES_DAYS
+from app.models import Shopkeeper
 
 
 def register_routes(bp):
@@ -41,27 +42,19 @@ def register_routes(bp):
         start_date = datetime.datetime.strptime(start, '%Y-%m-%d').date()
         end_date = datetime.datetime.strptime(end, '%Y-%m-%d').date()
         
-        # Query bills in range
-        query = Bill.query.filter_by(shopkeeper_id=shopkeeper.shopkeeper_id)
-        query = query.filter(Bill.bill_date >= start_date, Bill.bill_date <= end_date)
-        bills = query.order_by(Bill.bill_date.desc()).all()
+        # One page of per-day totals, grouped in the database; ?after= is the last date already shown
+        after = request.args.get('after')
+        after_date = datetime.datetime.strptime(after, '%Y-%m-%d').date() if after else None
+        report_page = SalesReportEngine.page(shopkeeper.shopkeeper_id, start_date, end_date, after=after_date)
         
-        # Build date list for the selected range
-        num_days = (end_date - start_date).days + 1
-        date_list = [(start_date + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(num_days)]
-        chart_data = {d: 0 for d in date_list}
-        
-        for bill in bills:
-            bill_date_str = bill.bill_date.strftime('%Y-%m-%d')
-            if bill_date_str in chart_data:
-                chart_data[bill_date_str] += float(bill.total_amount)
-        
-        chart_labels = list(chart_data.keys())
-        chart_values = list(chart_data.values())
+        # The chart series (loaded from the API) covers at most the range's last year
+        chart_start = max(start_date, end_date - datetime.timedelta(days=MAX_SERIES_DAYS - 1))
         
         return render_template('shopkeeper/sales_reports.html', 
-                             bills=bills, 
-                             chart_labels=chart_labels, 
-                             chart_values=chart_values, 
+                             rows=report_page['rows'], 
+                             next_after=report_page['next_after'], 
+                             prev_after=report_page['prev_after'], 
+                             has_prev=report_page['has_prev'], 
+                             chart_start=chart_start.strftime('%Y-%m-%d'), 
                              start=start, 
                              end=end)
\ No newline at end of file
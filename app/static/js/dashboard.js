@@ -1,89 +1,91 @@
-document.addEventListener('DOMContentLoaded', function() {
-    feather.replace();
+// dashboard.js
+// KPI cards and the monthly sales chart load from the JSON API after the page
+// shell renders. Both requests start at once; the browser revalidates them with
+// ETags, so an unchanged dashboard costs two 304s.
 
-    // The data for the chart will be passed from the Flask backend via Jinja templates.
-    // We'll grab the data from the script tag in the HTML template.
-    const chartDataElement = document.getElementById('chart-data');
-    const ctx = document.getElementById('monthlySalesChart');
-    
-    console.log('Chart canvas element:', ctx);
-    console.log('Chart data element:', chartDataElement);
-    
-    if (chartDataElement && ctx) {
-        try {
-            const labelsAttr = chartDataElement.getAttribute('data-labels');
-            const dataAttr = chartDataElement.getAttribute('data-data');
-            
-            console.log('Raw labels:', labelsAttr);
-            console.log('Raw data:', dataAttr);
-            
-            const monthlySalesLabels = JSON.parse(labelsAttr || '[]');
-            const monthlySalesData = JSON.parse(dataAttr || '[]');
-            
-            console.log('Parsed labels:', monthlySalesLabels);
-            console.log('Parsed data:', monthlySalesData);
-            
-            new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: monthlySalesLabels,
-                    datasets: [{
-                        label: 'Monthly Sales (₹)',
-                        data: monthlySalesData,
-                        backgroundColor: 'rgba(237, 106, 62, 0.2)',
-                        borderColor: '#ed6a3e',
-                        borderWidth: 2,
-                        tension: 0.4,
-                        fill: true,
-                    }]
+function fetchJSON(url) {
+    return fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(url + ' returned ' + response.status);
+            }
+            return response.json();
+        });
+}
+
+function loadKpiCards(container) {
+    return fetchJSON(container.dataset.src).then(function (kpis) {
+        container.querySelectorAll('[data-kpi]').forEach(function (element) {
+            const value = kpis[element.dataset.kpi];
+            element.textContent = element.dataset.kpi === 'monthly_growth' ? Math.abs(value) : value;
+        });
+        const growing = kpis.monthly_growth > 0;
+        document.getElementById('growth-up').classList.toggle('hidden', !growing);
+        document.getElementById('growth-down').classList.toggle('hidden', growing);
+    }).catch(function (error) {
+        console.error('Error loading dashboard KPIs:', error);
+        container.querySelectorAll('[data-kpi]').forEach(function (element) {
+            element.textContent = '-';
+        });
+    });
+}
+
+function loadMonthlySalesChart(canvas) {
+    return fetchJSON(canvas.dataset.src).then(function (series) {
+        new Chart(canvas.getContext('2d'), {
+            type: 'line',
+            data: {
+                labels: series.labels,
+                datasets: [{
+                    label: 'Monthly Sales (₹)',
+                    data: series.data,
+                    borderColor: '#ed6a3e',
+                    backgroundColor: 'rgba(237, 106, 62, 0.2)',
+                    borderWidth: 2,
+                    tension: 0.4,
+                    fill: true
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        display: false
+                    }
                 },
-                options: {
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: {
-                        legend: {
-                            display: false,
-                        },
-                        tooltip: {
-                            callbacks: {
-                                label: function(context) {
-                                    let label = context.dataset.label || '';
-                                    if (label) {
-                                        label += ': ';
-                                    }
-                                    if (context.parsed.y !== null) {
-                                        label += new Intl.NumberFormat('en-IN', { style: 'currency', currency: 'INR' }).format(context.parsed.y);
-                                    }
-                                    return label;
-                                }
-                            }
+                scales: {
+                    x: {
+                        grid: {
+                            display: false
                         }
                     },
-                    scales: {
-                        x: {
-                            grid: {
-                                display: false
-                            }
+                    y: {
+                        beginAtZero: true,
+                        grid: {
+                            color: '#e2e8f0' // Light gray grid lines
                         },
-                        y: {
-                            beginAtZero: true,
-                            grid: {
-                                color: 'rgba(200, 200, 200, 0.2)'
-                            },
-                            ticks: {
-                                callback: function(value, index, ticks) {
-                                    return '₹' + value;
-                                }
+                        ticks: {
+                            callback: function (value) {
+                                return '₹' + value.toLocaleString();
                             }
                         }
                     }
                 }
-            });
-            console.log('Chart created successfully');
-        } catch (error) {
-            console.error('Error creating chart:', error);
-        }
-    } else {
-        console.log('Chart elements not found - canvas:', !!ctx, 'data element:', !!chartDataElement);
+            }
+        });
+    }).catch(function (error) {
+        console.error('Error loading monthly sales chart:', error);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    const kpiCards = document.getElementById('kpi-cards');
+    const chartCanvas = document.getElementById('monthlySalesChart');
+    if (kpiCards) {
+        loadKpiCards(kpiCards);
+    }
+    if (chartCanvas) {
+        loadMonthlySalesChart(chartCanvas);
     }
 });
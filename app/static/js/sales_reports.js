@@ -1,36 +1,54 @@
 // sales_reports.js
 
 document.addEventListener('DOMContentLoaded', function () {
-    // Chart.js line chart
-    const ctx = document.getElementById('salesChart').getContext('2d');
-    const chartLabels = window.CHART_LABELS;
-    const chartValues = window.CHART_VALUES;
-    new Chart(ctx, {
-        type: 'line',
-        data: {
-            labels: chartLabels,
-            datasets: [{
-                label: 'Total Sales (₹)',
-                data: chartValues,
-                borderColor: '#ed6a3e',
-                backgroundColor: 'rgba(237,106,62,0.1)',
-                tension: 0.3,
-                fill: true,
-                pointRadius: 5,
-                pointBackgroundColor: '#ed6a3e',
-            }]
-        },
-        options: {
-            responsive: true,
-            plugins: {
-                legend: { display: false },
-                tooltip: { enabled: true }
-            },
-            scales: {
-                y: { beginAtZero: true }
+    // Chart.js line chart; the series loads from the JSON API (revalidated with its ETag)
+    const canvas = document.getElementById('salesChart');
+    fetch(canvas.dataset.src, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error('Sales series returned ' + response.status);
             }
-        }
-    });
+            return response.json();
+        })
+        .then(function (series) {
+            new Chart(canvas.getContext('2d'), {
+                type: 'line',
+                data: {
+                    labels: series.labels,
+                    datasets: [{
+                        label: 'Total Sales (₹)',
+                        data: series.sales,
+                        borderColor: '#ed6a3e',
+                        backgroundColor: 'rgba(237,106,62,0.1)',
+                        tension: 0.3,
+                        fill: true,
+                        pointRadius: 5,
+                        pointBackgroundColor: '#ed6a3e',
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    plugins: {
+                        legend: { display: false },
+                        tooltip: { enabled: true }
+                    },
+                    scales: {
+                        y: {
+                            beginAtZero: true,
+                            ticks: {
+                                callback: function (value) {
+                                    return '₹' + value.toLocaleString();
+                                }
+                            }
+                        }
+                    }
+                }
+            });
+        })
+        .catch(function (error) {
+            console.error('Error loading sales chart:', error);
+        });
 });
 
 function downloadTableAsCSV() {
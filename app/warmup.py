@@ -0,0 +1,37 @@
+"""
+Boot-time warm-up for preforking servers (see gunicorn.conf.py).
+Run once in the master after the app is loaded: heavy imports, parsed PDF
+stylesheets and compiled Jinja templates then live in pages every forked
+worker shares, and a worker's first request costs what later ones do.
+"""
+import importlib
+import logging
+
+log = logging.getLogger(__name__)
+
+# Imported lazily by request handlers; pulled in here so workers inherit them
+HEAVY_MODULES = ('weasyprint', 'pandas', 'xlsxwriter', 'numpy')
+
+
+def warm_up(app):
+    """Import heavy modules, parse PDF stylesheets and compile every template."""
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:  # Missing system libraries shouldn't stop the server booting
+            log.warning("Warm-up: could not import %s: %s", name, e)
+
+    try:
+        from .shopkeeper.services import PDFRenderer
+        PDFRenderer.warm()
+    except Exception as e:
+        log.warning("Warm-up: could not prepare PDF stylesheets: %s", e)
+
+    compiled = 0
+    for template_name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(template_name)
+            compiled += 1
+        except Exception as e:
+            log.warning("Warm-up: could not compile %s: %s", template_name, e)
+    log.info("Warm-up: compiled %d templates", compiled)
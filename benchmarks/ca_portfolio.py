@@ -0,0 +1,138 @@
+"""
+CA portfolio query-count benchmark: SQL statements and wall time for the CA
+dashboard and the employee dashboard as a firm's client list grows.
+
+    python benchmarks/ca_portfolio.py
+    python benchmarks/ca_portfolio.py --clients 10 100 400 --output results.json
+
+Each client count gets a fresh in-memory database seeded with that many
+approved clients (half of them filed for the current month) and one employee
+per ~13 clients. The pages must issue the same number of statements at every
+size; if they don't, the differing counts are reported and the exit status is 1.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import BenchmarkConfig  # puts the repo root on sys.path
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import (User, CharteredAccountant, CAConnection, CAEmployee, EmployeeClient,  # noqa: E402
+                        Shopkeeper, GSTFilingStatus)
+
+CLIENT_COUNTS = (10, 100, 400)
+CLIENTS_PER_EMPLOYEE = 13
+
+
+class PortfolioBenchmarkConfig(BenchmarkConfig):
+    SESSION_FILE_DIR = tempfile.mkdtemp(prefix='bench-sessions-')
+
+
+def seed_firm(clients: int):
+    """A CA with `clients` approved shopkeepers and their employees; returns (ca_user_id, employee_user_id)."""
+    month = datetime.now().strftime('%Y-%m')
+    ca_user = User(username='ca', email='ca@example.com', password_hash='x', role='CA')
+    db.session.add(ca_user)
+    db.session.flush()
+    ca = CharteredAccountant(user_id=ca_user.user_id, firm_name='Benchmark & Co', area='Central',
+                             contact_number='9999999999')
+    db.session.add(ca)
+    db.session.flush()
+
+    employees = []
+    for i in range(clients // CLIENTS_PER_EMPLOYEE + 1):
+        user = User(username=f'emp{i}', email=f'emp{i}@example.com', password_hash='x', role='employee')
+        db.session.add(user)
+        db.session.flush()
+        employee = CAEmployee(ca_id=ca.ca_id, user_id=user.user_id, name=f'Employee {i}', email=user.email)
+        db.session.add(employee)
+        employees.append(employee)
+    db.session.flush()
+
+    for i in range(clients):
+        user = User(username=f'shop{i}', email=f'shop{i}@example.com', password_hash='x', role='shopkeeper')
+        db.session.add(user)
+        db.session.flush()
+        shopkeeper = Shopkeeper(user_id=user.user_id, shop_name=f'Shop {i}', gst_number=f'29AAAAA{i:04d}A1Z5')
+        db.session.add(shopkeeper)
+        db.session.flush()
+        employee = employees[i % len(employees)]
+        db.session.add(CAConnection(shopkeeper_id=shopkeeper.shopkeeper_id, ca_id=ca.ca_id, status='approved'))
+        db.session.add(EmployeeClient(employee_id=employee.employee_id, shopkeeper_id=shopkeeper.shopkeeper_id))
+        if i % 2 == 0:
+            db.session.add(GSTFilingStatus(shopkeeper_id=shopkeeper.shopkeeper_id, employee_id=employee.employee_id,
+                                           month=month, status='Filed', filed_at=datetime.now()))
+    db.session.commit()
+    return ca_user.user_id, employees[0].user_id
+
+
+def run_case(clients: int, runs: int) -> dict:
+    """Statement counts and wall times for both dashboards at one client count."""
+    app = create_app(PortfolioBenchmarkConfig)
+    statements = []
+    with app.app_context():
+        db.create_all()
+        ca_user_id, employee_user_id = seed_firm(clients)
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+    pages = {}
+    for page, url, user_id in (('ca_dashboard', '/ca/dashboard', ca_user_id),
+                               ('employee_dashboard', '/ca/employee_dashboard', employee_user_id)):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        wall_ms = []
+        for _ in range(runs):
+            statements.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            wall_ms.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+        pages[page] = {'queries': len(statements), 'wall_ms_median': round(statistics.median(wall_ms), 2)}
+    return {'clients': clients, 'employees': clients // CLIENTS_PER_EMPLOYEE + 1, 'pages': pages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CA portfolio query-count benchmark.')
+    parser.add_argument('--clients', type=int, nargs='+', default=list(CLIENT_COUNTS), help='Client counts.')
+    parser.add_argument('--runs', type=int, default=5, help='Timed page loads per case.')
+    parser.add_argument('--output', help='Write JSON results here (default: stdout).')
+    args = parser.parse_args()
+
+    cases = []
+    for clients in args.clients:
+        case = run_case(clients, args.runs)
+        print(f"{clients:>5} clients  " + "  ".join(
+            f"{page} {data['queries']:>3} queries {data['wall_ms_median']:>8.1f}ms"
+            for page, data in case['pages'].items()), file=sys.stderr)
+        cases.append(case)
+
+    output = json.dumps({'cases': cases}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    failed = False
+    for page in cases[0]['pages']:
+        counts = {case['clients']: case['pages'][page]['queries'] for case in cases}
+        if len(set(counts.values())) > 1:
+            print(f"QUERY COUNT VARIES {page}: {counts}", file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Shared setup for the benchmarks: an app on in-memory SQLite and synthetic bills.
+"""
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User, Shopkeeper, Product, Bill, BillItem  # noqa: E402
+
+GST_RATES = (0, 5, 12, 18, 28)
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    PDF_CACHE_ENABLED = False
+    PDF_RENDER_WORKERS = 0
+
+
+def make_app():
+    """App with its tables created; use inside app.test_request_context()."""
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed_shopkeeper(template_choice: str = 'template2', products: int = 0) -> Shopkeeper:
+    """A shopkeeper with a catalog of `products` products."""
+    user = User(username='bench', email=f'bench-{template_choice}@example.com', password_hash='x', role='shopkeeper')
+    db.session.add(user)
+    db.session.flush()
+    shopkeeper = Shopkeeper(user_id=user.user_id, shop_name='Benchmark Traders', address='1 Market Road',
+                            gst_number='29ABCDE1234F1Z5', contact_number='9999999999',
+                            template_choice=template_choice, bank_name='State Bank',
+                            account_number='000123456789', ifsc_code='SBIN0000001')
+    db.session.add(shopkeeper)
+    db.session.flush()
+    db.session.add_all([
+        Product(shopkeeper_id=shopkeeper.shopkeeper_id, product_name=f'Product {i}', price=100 + i,
+                stock_qty=1000, gst_rate=GST_RATES[i % len(GST_RATES)], hsn_code=f'{8400 + i}')
+        for i in range(products)
+    ])
+    db.session.commit()
+    return shopkeeper
+
+
+def seed_bill(shopkeeper: Shopkeeper, items: int, bill_number: str = 'INV-0001') -> int:
+    """A bill with `items` lines over the shopkeeper's catalog; returns its bill_id."""
+    products = Product.query.filter_by(shopkeeper_id=shopkeeper.shopkeeper_id).order_by(Product.product_id).all()
+    bill = Bill(shopkeeper_id=shopkeeper.shopkeeper_id, bill_number=bill_number, customer_name='Walk-in',
+                customer_contact='9000000000', bill_date=date.today(), gst_type='GST', total_amount=0)
+    db.session.add(bill)
+    db.session.flush()
+    total = 0
+    for i in range(items):
+        product = products[i % len(products)]
+        db.session.add(BillItem(bill_id=bill.bill_id, product_id=product.product_id, quantity=1 + i % 3,
+                                price_per_unit=product.price, total_price=(1 + i % 3) * product.price))
+        total += (1 + i % 3) * product.price
+    bill.total_amount = total
+    db.session.commit()
+    return bill.bill_id
@@ -0,0 +1,180 @@
+"""
+Invoice rendering benchmark suite: bill_receipt.html + WeasyPrint, as used by
+download_bill_pdf, over synthetic bills.
+
+    python benchmarks/invoice_render.py --output results.json
+    python benchmarks/invoice_render.py --compare baseline.json --threshold 0.25
+
+Each (items, template) case runs in a fresh process so peak RSS belongs to that
+case alone. Per render it records wall and CPU time for two stages:
+  html - load the bill (ReceiptService) and render the receipt template
+  pdf  - lay the HTML out and write the PDF (PDFRenderer)
+Results are written as JSON. With --compare, median wall times more than
+--threshold slower than the baseline are reported and the exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import make_app, seed_shopkeeper, seed_bill  # puts the repo root on sys.path
+
+ITEM_COUNTS = (1, 50, 500)
+
+
+def _rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        'median': round(statistics.median(ordered), 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'min': round(ordered[0], 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def run_case(items: int, template_choice: str, runs: int, warmup: int) -> dict:
+    """Benchmark one bill size and template in the current (fresh) process."""
+    from flask import render_template
+    from app.shopkeeper.services import ReceiptService, PDFRenderer
+
+    app = make_app()
+    with app.test_request_context():
+        bill_id = seed_bill(seed_shopkeeper(template_choice, products=items), items)
+
+        def render_html():
+            bill = ReceiptService.load_bill(bill_id)
+            return render_template('shopkeeper/bill_receipt.html', **ReceiptService.build_context(bill),
+                                   is_editable=False, for_pdf=True)
+
+        html = render_html()
+        for _ in range(warmup):
+            PDFRenderer.write_pdf(render_html(), template_choice)
+        rss_before = _rss_mb()
+
+        stages = {'html': {'wall_ms': [], 'cpu_ms': []}, 'pdf': {'wall_ms': [], 'cpu_ms': []}}
+        rss_after_render = []
+        pdf_bytes = 0
+        for _ in range(runs):
+            wall, cpu = time.perf_counter(), time.process_time()
+            html = render_html()
+            stages['html']['wall_ms'].append((time.perf_counter() - wall) * 1000)
+            stages['html']['cpu_ms'].append((time.process_time() - cpu) * 1000)
+
+            wall, cpu = time.perf_counter(), time.process_time()
+            pdf_bytes = len(PDFRenderer.write_pdf(html, template_choice))
+            stages['pdf']['wall_ms'].append((time.perf_counter() - wall) * 1000)
+            stages['pdf']['cpu_ms'].append((time.process_time() - cpu) * 1000)
+            rss_after_render.append(_rss_mb())
+
+    return {
+        'case': f"{template_choice}/{items}",
+        'items': items,
+        'template': template_choice,
+        'runs': runs,
+        'html_bytes': len(html),
+        'pdf_bytes': pdf_bytes,
+        'stages': {name: {metric: _summary(values) for metric, values in data.items()}
+                   for name, data in stages.items()},
+        'peak_rss_mb': {
+            'before_renders': round(rss_before, 1),
+            'after_renders': round(rss_after_render[-1], 1),
+            'max_growth_per_render': round(max(b - a for a, b in zip([rss_before] + rss_after_render,
+                                                                      rss_after_render)), 1),
+        },
+    }
+
+
+def environment() -> dict:
+    try:
+        import weasyprint
+        weasyprint_version = weasyprint.__version__
+    except Exception:
+        weasyprint_version = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'weasyprint': weasyprint_version,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Stages whose median wall time regressed by more than threshold (a fraction)."""
+    previous = {case['case']: case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in results['cases']:
+        before = previous.get(case['case'])
+        if before is None:
+            continue
+        for stage, metrics in case['stages'].items():
+            old = before['stages'].get(stage, {}).get('wall_ms', {}).get('median')
+            new = metrics['wall_ms']['median']
+            if old and new > old * (1 + threshold):
+                regressions.append(f"{case['case']} {stage}: {old:.1f}ms -> {new:.1f}ms "
+                                   f"(+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice rendering benchmark suite.')
+    parser.add_argument('--items', type=int, nargs='+', default=list(ITEM_COUNTS), help='Bill sizes (line items).')
+    parser.add_argument('--templates', nargs='+', default=None, help='Template choices (default: all).')
+    parser.add_argument('--runs', type=int, default=10, help='Timed renders per case.')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed renders per case.')
+    parser.add_argument('--output', help='Write JSON results here (default: stdout).')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed median slowdown, e.g. 0.25 = 25%%.')
+    args = parser.parse_args()
+
+    from app.shopkeeper.services.pdf_renderer import TEMPLATE_CHOICES
+
+    cases = []
+    for template_choice in args.templates or TEMPLATE_CHOICES:
+        for items in args.items:
+            # Fresh process per case so peak RSS and caches are not shared between cases
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                case = executor.submit(run_case, items, template_choice, args.runs, args.warmup).result()
+            print(f"{case['case']:<16} html {case['stages']['html']['wall_ms']['median']:>8.1f}ms  "
+                  f"pdf {case['stages']['pdf']['wall_ms']['median']:>8.1f}ms  "
+                  f"peak {case['peak_rss_mb']['after_renders']:>7.1f}MB", file=sys.stderr)
+            cases.append(case)
+
+    results = {'environment': environment(), 'cases': cases}
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Invoice PDF render benchmark: per-render CSS/font setup vs PDFRenderer reuse.
+
+    python benchmarks/pdf_render.py --invoices 20 --items 15
+
+"before" renders the receipt as the app used to (inline <style>, fresh font
+setup inside every write_pdf call); "after" renders the for_pdf receipt with
+PDFRenderer's per-process parsed stylesheets and shared FontConfiguration.
+Runs against a throwaway in-memory SQLite database.
+"""
+import argparse
+import statistics
+import time
+
+from flask import render_template
+
+from common import make_app, seed_shopkeeper, seed_bill  # puts the repo root on sys.path
+from app.shopkeeper.services import ReceiptService, PDFRenderer
+from app.shopkeeper.services.pdf_renderer import TEMPLATE_CHOICES
+
+
+def timed(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--invoices', type=int, default=20, help='Renders per template and mode.')
+    parser.add_argument('--items', type=int, default=15, help='Line items per invoice.')
+    args = parser.parse_args()
+
+    from weasyprint import HTML
+
+    app = make_app()
+    with app.test_request_context():
+        bill = ReceiptService.load_bill(seed_bill(seed_shopkeeper(products=args.items), args.items))
+        context = ReceiptService.build_context(bill)
+
+        print(f"{args.invoices} invoices x {args.items} items per template (ms per invoice)")
+        print(f"{'template':<10} {'before':>9} {'after':>9} {'speedup':>8}")
+        for template_choice in TEMPLATE_CHOICES:
+            bill.shopkeeper.template_choice = template_choice
+            inline_html = render_template('shopkeeper/bill_receipt.html', **context, is_editable=False)
+            pdf_html = render_template('shopkeeper/bill_receipt.html', **context, is_editable=False, for_pdf=True)
+
+            # Parse this template's sheets outside the timed loop, as a warm worker would have
+            PDFRenderer.stylesheets(template_choice)
+
+            before = statistics.median(timed(lambda: HTML(string=inline_html).write_pdf(), args.invoices))
+            after = statistics.median(timed(lambda: PDFRenderer.write_pdf(pdf_html, template_choice), args.invoices))
+            print(f"{template_choice:<10} {before:>9.1f} {after:>9.1f} {before / after:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
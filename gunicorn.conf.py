@@ -0,0 +1,38 @@
+"""
+Production gunicorn settings: gunicorn -c gunicorn.conf.py run:app
+
+The app is loaded and warmed up (app/warmup.py) once in the master, then the
+heap is frozen so forked workers share those pages copy-on-write instead of
+each importing WeasyPrint/pandas and compiling templates on first request.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+preload_app = True
+
+# Keep the collector from running during boot; everything allocated here is long-lived
+gc.disable()
+
+
+def when_ready(server):
+    """Master, after the preloaded app exists and before workers fork."""
+    from app.warmup import warm_up
+
+    warm_up(server.app.wsgi())
+    gc.collect()
+    # Move boot objects out of the collector's view so GC passes in workers
+    # don't touch (and copy) the shared pages
+    gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker):
+    """Worker: drop any database connections inherited from the master."""
+    from app.extensions import db
+
+    with worker.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
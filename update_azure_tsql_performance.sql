@@ -0,0 +1,125 @@
+-- Azure T-SQL Schema Update Commands - Billing Performance
+-- File: update_azure_tsql_performance.sql
+-- Purpose: Tables, columns and indexes used by the high-throughput billing paths
+--
+-- Run these commands on your existing Azure SQL Server database.
+-- Each section is guarded so the script can be re-run safely.
+
+-- 1. Invoice number sequences (block-allocated invoice numbers per shopkeeper)
+IF OBJECT_ID('invoice_sequences', 'U') IS NULL
+BEGIN
+    CREATE TABLE invoice_sequences (
+        shopkeeper_id INT PRIMARY KEY,
+        next_value INT NOT NULL DEFAULT 1,
+        CONSTRAINT FK_invoice_sequences_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE
+    );
+
+    -- Seed from the legacy counter so numbering continues where it left off
+    INSERT INTO invoice_sequences (shopkeeper_id, next_value)
+    SELECT shopkeeper_id, ISNULL(current_invoice_number, 1)
+    FROM shopkeepers;
+
+    PRINT 'Created invoice_sequences table';
+END;
+GO
+
+-- 2. Idempotency keys for bill submission (client retries return the original bill)
+IF COL_LENGTH('bills', 'idempotency_key') IS NULL
+BEGIN
+    ALTER TABLE bills ADD idempotency_key NVARCHAR(64) NULL;
+    PRINT 'Added bills.idempotency_key';
+END;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_bills_shopkeeper_idempotency')
+BEGIN
+    CREATE UNIQUE INDEX UX_bills_shopkeeper_idempotency
+        ON bills(shopkeeper_id, idempotency_key)
+        WHERE idempotency_key IS NOT NULL;
+    PRINT 'Created UX_bills_shopkeeper_idempotency';
+END;
+GO
+
+-- 3. GST snapshot on bill items (rate, HSN and tax amounts as billed)
+--    Existing rows are filled by: flask backfill-bill-item-gst
+IF COL_LENGTH('bill_items', 'gst_rate') IS NULL
+BEGIN
+    ALTER TABLE bill_items ADD
+        product_name NVARCHAR(100) NULL,
+        hsn_code NVARCHAR(20) NULL,
+        gst_rate DECIMAL(5,2) NULL,
+        discount_percent DECIMAL(5,2) NULL,
+        discount_amount DECIMAL(10,2) NULL,
+        taxable_value DECIMAL(12,2) NULL,
+        cgst_amount DECIMAL(10,2) NULL,
+        sgst_amount DECIMAL(10,2) NULL;
+    PRINT 'Added GST snapshot columns to bill_items';
+END;
+GO
+
+-- 4. Bill content version (part of the rendered PDF cache key)
+IF COL_LENGTH('bills', 'version') IS NULL
+BEGIN
+    ALTER TABLE bills ADD version INT NOT NULL CONSTRAINT DF_bills_version DEFAULT 1;
+    PRINT 'Added bills.version';
+END;
+GO
+
+-- 5. Daily sales rollup (dashboard and report charts read this instead of bills)
+--    Fill it for existing bills with: flask rebuild-sales-rollup
+IF OBJECT_ID('daily_sales_rollup', 'U') IS NULL
+BEGIN
+    CREATE TABLE daily_sales_rollup (
+        shopkeeper_id INT NOT NULL,
+        sales_date DATE NOT NULL,
+        bill_count INT NOT NULL DEFAULT 0,
+        gross_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        paid_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        due_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        gst_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        updated_at DATETIME2 DEFAULT GETDATE(),
+        CONSTRAINT PK_daily_sales_rollup PRIMARY KEY (shopkeeper_id, sales_date),
+        CONSTRAINT FK_daily_sales_rollup_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE
+    );
+    PRINT 'Created daily_sales_rollup table';
+END;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_bills_shopkeeper_date')
+BEGIN
+    CREATE INDEX IX_bills_shopkeeper_date ON bills(shopkeeper_id, bill_date);
+    PRINT 'Created IX_bills_shopkeeper_date';
+END;
+GO
+
+-- 6. GST filing status by client and month (CA dashboard filed/pending counts)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_gst_filing_shopkeeper_month')
+BEGIN
+    CREATE INDEX IX_gst_filing_shopkeeper_month ON gst_filing_status(shopkeeper_id, month) INCLUDE (status);
+    PRINT 'Created IX_gst_filing_shopkeeper_month';
+END;
+GO
+
+-- 7. GST return snapshots (summary frozen when a month is marked Filed)
+IF OBJECT_ID('gst_return_snapshots', 'U') IS NULL
+BEGIN
+    CREATE TABLE gst_return_snapshots (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        shopkeeper_id INT NOT NULL,
+        month NVARCHAR(7) NOT NULL,
+        summary NVARCHAR(MAX) NOT NULL,
+        created_at DATETIME2 DEFAULT GETDATE(),
+        CONSTRAINT UQ_gst_return_snapshots_shopkeeper_month UNIQUE (shopkeeper_id, month),
+        CONSTRAINT FK_gst_return_snapshots_shopkeeper FOREIGN KEY (shopkeeper_id) REFERENCES shopkeepers(shopkeeper_id) ON DELETE CASCADE
+    );
+    PRINT 'Created gst_return_snapshots table';
+END;
+GO
+
+-- 8. Invoice sequence reset epoch (workers drop number blocks reserved before a reset)
+IF COL_LENGTH('invoice_sequences', 'reset_epoch') IS NULL
+BEGIN
+    ALTER TABLE invoice_sequences ADD reset_epoch INT NOT NULL CONSTRAINT DF_invoice_sequences_reset_epoch DEFAULT 0;
+    PRINT 'Added invoice_sequences.reset_epoch';
+END;
+GO